@@ -23,7 +23,8 @@ ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
 SOFTWARE."""
 
 __all__ = ['bugreport', 'utils', 'urlutils', 'checkbuildd', 'checkversions',
-           'debbugs', 'exceptions', 'submit', 'tempfile', 'mailer']
+           'debbugs', 'exceptions', 'submit', 'tempfile', 'mailer', 'integrity',
+           'prefetch']
 
 VERSION_NUMBER = "11.1.0"
 
@@ -24,7 +24,6 @@ import os
 
 from . import utils
 from . import debbugs
-import subprocess
 import os
 
 from .exceptions import *
@@ -39,10 +38,28 @@ class bugreport(object):
     # Default character set for str(x)
     charset = 'utf-8'
 
+    # The sections of the report, in order, with the attributes they are
+    # rendered from: a section is rendered again only if one of those is
+    # set (or deleted) after it was rendered
+    sections = (
+        ('header', ('package', 'issource', 'followup', 'pseudoheaders', 'version',
+                    'severity', 'justification', 'tags', 'filename')),
+        ('body', ('body', 'mode', 'package', 'system')),
+        ('incfiles', ('incfiles',)),
+        ('sysinfo', ('sysinfo', 'system')),
+        ('depinfo', ('depinfo',)),
+        ('confinfo', ('confinfo',)),
+        ('debsums', ('debsumsoutput',)),
+    )
+
     def __init__(self, package, subject='', body='', system='debian',
                  incfiles='', sysinfo=True,
                  followup=False, type='debbugs', mode=utils.MODE_STANDARD,
                  debsumsoutput=None, issource=False, **props):
+        # rendered sections, and the whole report
+        self._rendered = {}
+        self._report = None
+
         self.type = type
         for (k, v) in props.items():
             setattr(self, k, v)
@@ -66,6 +83,23 @@ class bugreport(object):
         self.debsumsoutput = debsumsoutput
         self.issource = issource
 
+    def _invalidate(self, name):
+        rendered = self.__dict__.get('_rendered')
+        if rendered is None or name.startswith('_'):
+            return
+        self._report = None
+        for section, attrs in self.sections:
+            if name in attrs:
+                rendered.pop(section, None)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self._invalidate(name)
+
+    def __delattr__(self, name):
+        object.__delattr__(self, name)
+        self._invalidate(name)
+
     def tset(self, value):
         if value not in ('debbugs', 'launchpad'):
             ui.long_message('invalid report type %s, defaulting to debbugs' %
@@ -78,13 +112,68 @@ class bugreport(object):
         return self.__type
     type = property(tget, tset)
 
-    def __unicode__(self):
+    def render_header(self):
+        ph = getattr(self, 'pseudoheaders', None)
+        if ph:
+            headers = ['\n'.join(ph) + '\n']
+        else:
+            headers = []
+
+        version = getattr(self, 'version', None)
+        if version:
+            headers.append('Version: %s\n' % version)
+
+        if self.issource:
+            reportto = 'Source'
+        else:
+            reportto = 'Package'
+
+        if not self.followup:
+            for (attr, name) in dict(severity='Severity',
+                                     justification='Justification',
+                                     tags='Tags',
+                                     filename='File').items():
+                a = getattr(self, attr, None)
+                if a:
+                    headers.append('%s: %s\n' % (name, a))
+
+            return "%s: %s\n%s\n" % (reportto, self.package, ''.join(headers))
+        else:
+            if hasattr(self, 'tags') and self.tags:
+                headers.append(f'Control: tags -1 {self.tags}\n')
+            return "Followup-For: Bug #%d\n%s: %s\n%s\n" % (
+                self.followup, reportto, self.package, ''.join(headers))
+
+    def render_body(self):
+        body = getattr(self, 'body', '')
+
+        # add NEWBIELINE only if it's less than advanced and the package is not
+        # one of the specials (f.e. those with a dedicated function) also
+        # thinking about those systems that don't have 'specials' dict
+        # and if a body wasn't provided on the command line
+        if self.mode < utils.MODE_ADVANCED and not body and self.package not in \
+                list(debbugs.SYSTEMS[self.system].get('specials', {}).keys()):
+            return utils.NEWBIELINE + '\n\n' + body
+        elif not body:
+            return '\n\n'
+        else:
+            return body + '\n'
+
+    def render_incfiles(self):
+        return self.incfiles
+
+    def render_sysinfo(self):
+        # Don't include system info for certain packages
+        if not self.sysinfo:
+            return ''
+
         un = os.uname()
-        debinfo = ''
-        shellpath = utils.realpath('/bin/sh')
-        init = utils.get_init_system()
-        lsminfo = utils.get_lsm_info()
-        taint_flags = utils.get_kernel_taint_flags()
+        # the probes are run concurrently, and only once
+        facts = utils.get_system_facts(debbugs.system_probes(self.system))
+        shellpath = facts.get('shellpath')
+        init = facts.get('init')
+        lsminfo = facts.get('lsminfo')
+        taint_flags = facts.get('taint_flags')
 
         locinfo = []
         langsetting = os.environ.get('LANG', 'C')
@@ -100,7 +189,7 @@ class bugreport(object):
                     locinfo.append('LANGUAGE not set')
                     continue
             else:
-                env = '%s (charmap=%s)' % (os.environ.get(setting, langsetting), subprocess.getoutput("locale charmap"))
+                env = '%s (charmap=%s)' % (os.environ.get(setting, langsetting), facts.get('charmap'))
 
                 if allsetting and env:
                     env = "%s (ignored: LC_ALL set to %s)" % (env, allsetting)
@@ -110,54 +199,10 @@ class bugreport(object):
 
         locinfo = ', '.join(locinfo)
 
-        ph = getattr(self, 'pseudoheaders', None)
-        if ph:
-            headers = '\n'.join(ph) + '\n'
-        else:
-            headers = ''
-
-        version = getattr(self, 'version', None)
-        if version:
-            headers += 'Version: %s\n' % version
-
-        body = getattr(self, 'body', '')
-
-        # add NEWBIELINE only if it's less than advanced and the package is not
-        # one of the specials (f.e. those with a dedicated function) also
-        # thinking about those systems that don't have 'specials' dict
-        # and if a body wasn't provided on the command line
-        if self.mode < utils.MODE_ADVANCED and not body and self.package not in \
-                list(debbugs.SYSTEMS[self.system].get('specials', {}).keys()):
-            body = utils.NEWBIELINE + '\n\n' + body
-        elif not body:
-            body = '\n\n'
-        else:
-            body += '\n'
-
-        if self.issource:
-            reportto = 'Source'
-        else:
-            reportto = 'Package'
-
-        if not self.followup:
-            for (attr, name) in dict(severity='Severity',
-                                     justification='Justification',
-                                     tags='Tags',
-                                     filename='File').items():
-                a = getattr(self, attr, None)
-                if a:
-                    headers += '%s: %s\n' % (name, a)
-
-            report = "%s: %s\n%s\n" % (reportto, self.package, headers)
-        else:
-            if hasattr(self, 'tags') and self.tags:
-                headers += f'Control: tags -1 {self.tags}\n'
-            report = "Followup-For: Bug #%d\n%s: %s\n%s\n" % (
-                self.followup, reportto, self.package, headers)
-
+        debinfo = ['\n-- System Information:\n']
         infofunc = debbugs.SYSTEMS[self.system].get('infofunc', debbugs.generic_infofunc)
         if infofunc:
-            debinfo += infofunc()
+            debinfo.append(infofunc(facts))
 
         if un[0] == 'GNU':
             # Use uname -v on Hurd
@@ -184,35 +229,43 @@ class bugreport(object):
                     uname_string = '%s (%s)' % (uname_string, '; '.join(kinfo))
 
         if uname_string:
-            debinfo += 'Kernel: %s\n' % uname_string
+            debinfo.append('Kernel: %s\n' % uname_string)
         if taint_flags:
-            debinfo += 'Kernel taint flags: %s\n' % ', '.join(taint_flags)
+            debinfo.append('Kernel taint flags: %s\n' % ', '.join(taint_flags))
 
         if locinfo:
-            debinfo += 'Locale: %s\n' % locinfo
+            debinfo.append('Locale: %s\n' % locinfo)
         if shellpath != '/bin/sh':
-            debinfo += 'Shell: /bin/sh linked to %s\n' % shellpath
+            debinfo.append('Shell: /bin/sh linked to %s\n' % shellpath)
         if init:
-            debinfo += 'Init: %s\n' % init
+            debinfo.append('Init: %s\n' % init)
         if lsminfo:
-            debinfo += 'LSM: %s\n' % lsminfo
+            debinfo.append('LSM: %s\n' % lsminfo)
 
-        # Don't include system info for certain packages
-        if self.sysinfo:
-            report = "%s%s%s\n-- System Information:\n%s" % (report, body, self.incfiles, debinfo)
-        else:
-            report = "%s%s%s" % (report, body, self.incfiles)
+        return ''.join(debinfo)
+
+    def render_depinfo(self):
+        return getattr(self, 'depinfo', '')
 
-        if hasattr(self, 'depinfo'):
-            report += self.depinfo
-        if hasattr(self, 'confinfo'):
-            report += self.confinfo
+    def render_confinfo(self):
+        return getattr(self, 'confinfo', '')
 
+    def render_debsums(self):
         # add debsums output to the bug report
         if self.debsumsoutput:
-            report += "\n-- debsums errors found:\n%s\n" % self.debsumsoutput
+            return "\n-- debsums errors found:\n%s\n" % self.debsumsoutput
+        return ''
 
-        return report
+    def section(self, name):
+        """Return a section of the report, rendering it if needed"""
+        if name not in self._rendered:
+            self._rendered[name] = getattr(self, 'render_' + name)()
+        return self._rendered[name]
+
+    def __unicode__(self):
+        if self._report is None:
+            self._report = ''.join(self.section(name) for name, attrs in self.sections)
+        return self._report
 
     def __str__(self):
         return self.__unicode__()
@@ -21,10 +21,20 @@
 #  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
 #  SOFTWARE.
 
+import os
 import sys
+import gzip
+import json
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import concurrent.futures
 import urllib.request, urllib.error, urllib.parse
 
 from . import utils
+from . import prefetch
+from . import urlutils
 from .urlutils import open_url
 from reportbug.exceptions import (
     NoNetwork,
@@ -37,6 +47,12 @@ from debian import debian_support
 RMADISON_URL = 'https://qa.debian.org/madison.php?package=%s&text=on'
 INCOMING_URL = 'http://incoming.debian.org/'
 NEWQUEUE_URL = 'http://ftp-master.debian.org/new.822'
+APT_LISTS_DIR = '/var/lib/apt/lists'
+
+# packages asked to madison in one query, and queries run at once, by
+# check_available_many()
+MADISON_BATCH = 50
+AUDIT_JOBS = 4
 
 
 ## This needs to be adapted now that incoming is an APT repository
@@ -83,7 +99,246 @@ def later_version(a, b):
     return a
 
 
-def get_versions_available(package, timeout, dists=None, http_proxy=None, arch='i386'):
+class AptVersionIndex(object):
+    """Persistent index of the versions in the APT package lists.
+
+    The *_Packages files in /var/lib/apt/lists give the versions available
+    in each suite (named after the Suite field of their Release file)
+    without asking madison.  Only the lists of the Debian archive
+    (Origin: Debian) count, and only the binary packages of the native
+    architecture and arch:all ones are indexed, as madison is queried;
+    the lists which changed since last time are reindexed.
+
+    After an apt update, that is most of them, which takes a while: the
+    reindexing can then be done in the background, see
+    get_apt_version_index()."""
+
+    version = 2
+
+    def __init__(self, filename=None, listsdir=APT_LISTS_DIR):
+        self.listsdir = listsdir
+        if filename is None:
+            filename = os.path.join(utils.CACHEDIR, 'apt-versions.sqlite')
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.db = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS lists (name TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, suite TEXT);
+            CREATE TABLE IF NOT EXISTS versions (list TEXT, package TEXT, version TEXT);
+            CREATE INDEX IF NOT EXISTS versions_package ON versions (package);
+            CREATE INDEX IF NOT EXISTS versions_list ON versions (list);
+        ''')
+        self.arch = utils.get_arch()
+        if self._meta('version') != self.version or self._meta('arch') != self.arch:
+            with self.db:
+                self.db.execute('DELETE FROM lists')
+                self.db.execute('DELETE FROM versions')
+                self.db.execute('DELETE FROM meta')
+                self._set_meta('version', self.version)
+                self._set_meta('arch', self.arch)
+
+    def _meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    @staticmethod
+    def release_suite(filename):
+        """The suite of a Release or InRelease file, e.g. 'unstable', or
+        None if it isn't one of the Debian archive"""
+        suite = codename = origin = None
+        try:
+            with open(filename, errors='backslashreplace') as fp:
+                for line in fp:
+                    if line.startswith('Origin:'):
+                        origin = line[7:].strip()
+                    elif line.startswith('Suite:'):
+                        suite = line[6:].strip()
+                    elif line.startswith('Codename:'):
+                        codename = line[9:].strip()
+                    elif line[:1] == ' ':
+                        # the checksums: all the fields are before them
+                        break
+        except IOError:
+            return None
+        # third-party repositories may call their suites stable or unstable
+        if origin != 'Debian':
+            return None
+        suite = suite or codename
+        return utils.CODENAME2SUITE.get(suite, suite)
+
+    def is_current(self):
+        """Whether no list changed since the last refresh"""
+        dirmtime = os.stat(self.listsdir).st_mtime_ns
+        with self.lock:
+            return self._meta('dirmtime') == dirmtime
+
+    def refreshing(self):
+        """Whether a refresh is running in the background"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def refresh_in_background(self):
+        """Start refresh() in a thread, unless it already runs"""
+        if self.refreshing():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except (OSError, sqlite3.Error):
+                pass
+
+        # a daemon thread: an interrupted refresh is rolled back, and
+        # done again next time
+        self.thread = threading.Thread(target=run, name='apt-version-index', daemon=True)
+        self.thread.start()
+
+    def refresh(self):
+        """Reindex the lists which changed since the last refresh"""
+        # apt replaces the lists by renaming, so if the directory didn't
+        # change, none of them did
+        dirmtime = os.stat(self.listsdir).st_mtime_ns
+        with self.lock:
+            if self._meta('dirmtime') == dirmtime:
+                return
+
+            releases = {}
+            lists = []
+            for entry in os.scandir(self.listsdir):
+                for suffix in ('_InRelease', '_Release'):
+                    if entry.name.endswith(suffix):
+                        releases.setdefault(entry.name[:-len(suffix)] + '_', entry.path)
+                if entry.name.endswith(('_Packages', '_Packages.gz')):
+                    lists.append(entry)
+
+            indexed = dict((name, (mtime, size, suite)) for name, mtime, size, suite in
+                           self.db.execute('SELECT name, mtime, size, suite FROM lists'))
+            suites = {}
+            with self.db:
+                for entry in lists:
+                    # the list belongs to the Release file of its longest prefix
+                    prefix = max((prefix for prefix in releases if entry.name.startswith(prefix)),
+                                 key=len, default=None)
+                    if prefix not in suites:
+                        suites[prefix] = self.release_suite(releases[prefix]) if prefix else None
+                    suite = suites[prefix]
+
+                    st = entry.stat()
+                    old = indexed.pop(entry.name, None)
+                    if old == (st.st_mtime_ns, st.st_size, suite):
+                        continue
+                    if old and old[:2] == (st.st_mtime_ns, st.st_size):
+                        self.db.execute('UPDATE lists SET suite = ? WHERE name = ?', (suite, entry.name))
+                        continue
+                    self._index_list(entry.name, entry.path, st, suite)
+
+                # those left have been removed
+                for name in indexed:
+                    self.db.execute('DELETE FROM versions WHERE list = ?', (name,))
+                    self.db.execute('DELETE FROM lists WHERE name = ?', (name,))
+                self._set_meta('dirmtime', dirmtime)
+
+    def _index_list(self, name, filename, st, suite):
+        versions = {}
+        opener = gzip.open if filename.endswith('.gz') else open
+        try:
+            with opener(filename, 'rt', errors='backslashreplace') as fp:
+                package = version = architecture = None
+                for line in fp:
+                    if line.startswith('Package:'):
+                        package = line[8:].strip()
+                    elif line.startswith('Version:'):
+                        version = line[8:].strip()
+                    elif line.startswith('Architecture:'):
+                        architecture = line[13:].strip()
+                    elif line == '\n':
+                        self._add_version(versions, package, version, architecture)
+                        package = version = architecture = None
+                self._add_version(versions, package, version, architecture)
+        except (IOError, EOFError):
+            versions = {}
+        self.db.execute('DELETE FROM versions WHERE list = ?', (name,))
+        self.db.executemany('INSERT INTO versions VALUES (?, ?, ?)',
+                            ((name, package, version) for package, version in versions.items()))
+        self.db.execute('INSERT OR REPLACE INTO lists VALUES (?, ?, ?, ?)',
+                        (name, st.st_mtime_ns, st.st_size, suite))
+
+    def _add_version(self, versions, package, version, architecture):
+        if not (package and version) or architecture not in ('all', self.arch):
+            return
+        if package not in versions or compare_versions(versions[package], version) > 0:
+            versions[package] = version
+
+    def suites(self):
+        """The suites the lists are known for"""
+        with self.lock:
+            return set(suite for suite, in self.db.execute(
+                'SELECT DISTINCT suite FROM lists WHERE suite IS NOT NULL'))
+
+    def lookup(self, package, dists):
+        """Return the versions of package in the dists which have lists,
+        as get_versions_available(), and the dists which have none.
+
+        A package in none of the lists (e.g. from a component which isn't
+        enabled) has all the dists left to ask to madison."""
+        known = self.suites()
+        wanted = dict((utils.CODENAME2SUITE.get(dist, dist), dist) for dist in dists)
+        versions = {}
+        with self.lock:
+            rows = self.db.execute('SELECT lists.suite, versions.version FROM versions '
+                                   'JOIN lists ON versions.list = lists.name '
+                                   'WHERE versions.package = ? AND lists.suite IS NOT NULL',
+                                   (package,)).fetchall()
+        if not rows:
+            return versions, list(dists)
+        for suite, version in rows:
+            if suite in wanted and (suite not in versions or
+                                    compare_versions(versions[suite], version) > 0):
+                versions[suite] = version
+        return versions, [dist for suite, dist in wanted.items() if suite not in known]
+
+
+_apt_version_index = None
+
+
+def get_apt_version_index(wait=False):
+    """Return the (shared, up to date) AptVersionIndex, or None if there
+    are no lists to build it from.
+
+    When lists changed, they are reindexed in the background and None is
+    returned meanwhile, so that madison is asked instead of keeping the
+    user waiting; unless wait is true, e.g. when madison can't be asked."""
+    global _apt_version_index
+
+    try:
+        if _apt_version_index is None:
+            try:
+                _apt_version_index = AptVersionIndex()
+            except (OSError, sqlite3.Error):
+                # no usable cache directory: keep the index in memory
+                _apt_version_index = AptVersionIndex(':memory:')
+        index = _apt_version_index
+        if index.refreshing():
+            if not wait:
+                return None
+            index.thread.join()
+        if not index.is_current():
+            if not wait:
+                index.refresh_in_background()
+                return None
+            index.refresh()
+    except (OSError, sqlite3.Error):
+        _apt_version_index = None
+    return _apt_version_index
+
+
+def get_versions_available(package, timeout, dists=None, http_proxy=None, arch='i386',
+                           local_only=False):
     """:param package:
 
         Name of the package, e.g. ``"reportbug"``.
@@ -103,6 +358,13 @@ def get_versions_available(package, timeout, dists=None, http_proxy=None, arch='
         The proxy to use for the http protocol.  By default, use the
         :func:`urllib.request.getproxies()` settings.
 
+    :param local_only:
+
+        If truthy, only look in the APT lists, and never query madison.
+
+    The local APT lists are looked at first (see :class:`AptVersionIndex`),
+    madison is only queried for the dists which have none.
+
     :returns:
 
         A map of each dist to a version of the package, e.g.::
@@ -124,9 +386,31 @@ def get_versions_available(package, timeout, dists=None, http_proxy=None, arch='
     if not dists:
         dists = ('oldstable', 'stable', 'testing', 'unstable', 'experimental')
 
+    versions = {}
+    index = get_apt_version_index(wait=local_only)
+    if index is not None:
+        versions, dists = index.lookup(package, dists)
+    if not dists or local_only:
+        return versions
+
+    for stuff in query_madison([package], dists, timeout, http_proxy).values():
+        versions.update(stuff)
+    return versions
+
+
+def query_madison(packages, dists, timeout, http_proxy=None):
+    """Ask madison for the versions of several packages at once.
+
+    :returns:
+
+        A map of each package to the versions found, as returned by
+        :func:`get_versions_available`; empty if madison can't be
+        reached.
+
+    """
     arch = utils.get_arch()
 
-    url = RMADISON_URL % package
+    url = RMADISON_URL % urllib.parse.quote(' '.join(packages))
     url += '&s=' + ','.join(dists)
     # select only those lines that refers to source pkg
     # or to binary packages available on the current arch
@@ -168,34 +452,139 @@ def get_versions_available(package, timeout, dists=None, http_proxy=None, arch='
         # dist name (e.g. "testing").
         dist = utils.CODENAME2SUITE.get(d, d)
 
-        versions[dist] = v
+        versions.setdefault(p, {})[dist] = v
 
     return versions
 
 
+class NewQueueIndex(object):
+    """The packages in the NEW queue, by source package.
+
+    new.822 is parsed once per version of it: the index is kept, in memory
+    and in a file of the cache directory, with the validators of the page
+    in the HTTP cache it comes from.  While that page is fresh, the index
+    is used without even reading it; it is only rebuilt when it changes."""
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(utils.CACHEDIR, 'new.822.index')
+        self.filename = filename
+        self.key = None
+        # source -> [(distribution, queue, version)]
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def page_key(meta):
+        """What tells the versions of a page in the HTTP cache apart"""
+        if meta.get('etag') or meta.get('last_modified'):
+            return [meta.get('etag'), meta.get('last_modified')]
+        return [meta.get('fetched')]
+
+    @staticmethod
+    def parse(page):
+        sources = {}
+        for para in Deb822.iter_paragraphs(page):
+            if not all(field in para for field in ('Source', 'Distribution', 'Queue', 'Version')):
+                continue
+            versions = sources.setdefault(para['Source'], {})
+            # in case of multiple versions, choose the bigger
+            versions[(para['Distribution'], para['Queue'])] = max(para['Version'].split())
+        return {source: [(dist, queue, version) for (dist, queue), version in versions.items()]
+                for source, versions in sources.items()}
+
+    def load(self, key):
+        try:
+            with open(self.filename) as fp:
+                data = json.load(fp)
+        except (IOError, ValueError):
+            return False
+        if data.get('key') != key:
+            return False
+        self.sources = data['sources']
+        self.key = key
+        return True
+
+    def save(self):
+        data = {'key': self.key, 'sources': self.sources}
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(self.filename), prefix='.tmp')
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(data, fp)
+            os.replace(tmpname, self.filename)
+        except (IOError, OSError):
+            pass
+
+    def current(self, key):
+        """Whether the index is the one of the page version key, which is
+        then loaded if needed"""
+        with self.lock:
+            return key == self.key or self.load(key)
+
+    def update(self, page, key=None):
+        """Index this version of new.822, unless it already is; without
+        the key of its version in the HTTP cache, the page is told apart
+        by its digest"""
+        if key is None:
+            key = [hashlib.sha256(page.encode('utf-8', 'surrogatepass')).hexdigest()]
+        with self.lock:
+            if key == self.key or self.load(key):
+                return
+            self.sources = self.parse(page)
+            self.key = key
+            self.save()
+
+    def versions(self, package):
+        """Return the versions of a source package in the queue, as a
+        mapping of 'distribution (queue)' to the version"""
+        return {dist + ' (' + queue + ')': version
+                for dist, queue, version in self.sources.get(package, ())}
+
+
+_newqueue_index = None
+
+
+def get_newqueue_index():
+    """Return the NewQueueIndex of this run"""
+    global _newqueue_index
+
+    if _newqueue_index is None:
+        _newqueue_index = NewQueueIndex()
+    return _newqueue_index
+
+
 def get_newqueue_available(package, timeout, dists=None, http_proxy=None, arch='i386'):
     if dists is None:
         dists = ('unstable (new queue)',)
+    index = get_newqueue_versions(timeout, http_proxy)
+    if index is None:
+        return {}
+    return index.versions(package)
+
+
+def get_newqueue_versions(timeout, http_proxy=None):
+    """Return the up to date NewQueueIndex, or None if new.822 can't be
+    fetched; to look up many packages, fetching new.822 once"""
+    cache = urlutils.get_http_cache()
+    index = get_newqueue_index()
+    meta = cache.get_meta(NEWQUEUE_URL)
+    if meta and cache.is_fresh(meta) and index.current(index.page_key(meta)):
+        return index
+
     try:
         page = open_url(NEWQUEUE_URL, http_proxy, timeout)
     except NoNetwork:
-        return {}
+        return None
     except urllib.error.HTTPError as x:
         print("Warning:", x, file=sys.stderr)
-        return {}
+        return None
     if not page:
-        return {}
-
-    versions = {}
-
-    # iter over the entries, one paragraph at a time
-    for para in Deb822.iter_paragraphs(page):
-        if para['Source'] == package:
-            k = para['Distribution'] + ' (' + para['Queue'] + ')'
-            # in case of multiple versions, choose the bigger
-            versions[k] = max(para['Version'].split())
+        return None
 
-    return versions
+    meta = cache.get_meta(NEWQUEUE_URL)
+    index.update(page, index.page_key(meta) if meta else None)
+    return index
 
 
 def get_incoming_version(package, timeout, http_proxy=None, arch='i386'):
@@ -248,9 +637,42 @@ def get_incoming_version(package, timeout, http_proxy=None, arch='i386'):
     return None
 
 
+def prefetch_available(package, timeout, dists=None,
+                       check_incoming=True, check_newqueue=True,
+                       http_proxy=None, arch='i386', local_only=False):
+    """Start the queries of :func:`check_available` in the background.
+
+    The queries all run at once; :func:`check_available` called with the
+    same arguments picks up their results.
+
+    :returns:
+
+        The queries, as a mapping of their name to the function and its
+        arguments.
+
+    """
+    queries = {}
+    if check_incoming and not local_only:
+        queries['incoming'] = (get_incoming_version,
+                               (package, timeout, http_proxy, arch))
+    queries['madison'] = (get_versions_available,
+                          (package, timeout, dists, http_proxy, arch, local_only))
+    if check_newqueue and not local_only:
+        srcpackage = utils.get_source_name(package)
+        if srcpackage is None:
+            srcpackage = package
+        queries['newqueue'] = (get_newqueue_available,
+                               (srcpackage, timeout, dists, http_proxy, arch))
+
+    prefetcher = prefetch.get_prefetcher()
+    for func, args in queries.values():
+        prefetcher.submit(func, *args)
+    return queries
+
+
 def check_available(package, version, timeout, dists=None,
                     check_incoming=True, check_newqueue=True,
-                    http_proxy=None, arch='i386'):
+                    http_proxy=None, arch='i386', local_only=False):
     """:param package:
 
         Name of the package, e.g. ``"emacs"``.
@@ -273,6 +695,11 @@ def check_available(package, version, timeout, dists=None,
         The proxy to use for the http protocol.  By default, use the
         :func:`urllib.request.getproxies()` settings.
 
+    :param local_only:
+
+        If truthy, only look for versions in the local APT lists, without
+        any network query.
+
     :returns:
 
         A tuple ``(avail, toonew)``::
@@ -289,22 +716,30 @@ def check_available(package, version, timeout, dists=None,
             distributions.
 
     """
+    prefetcher = prefetch.get_prefetcher()
+    queries = prefetch_available(package, timeout, dists, check_incoming,
+                                 check_newqueue, http_proxy, arch, local_only)
+
     avail = {}
+    for name, (func, args) in queries.items():
+        stuff = prefetcher.result(func, *args)
+        if name == 'incoming':
+            if stuff:
+                avail['incoming'] = stuff
+        else:
+            avail.update(stuff)
+
+    return compare_available(version, avail)
 
-    if check_incoming:
-        iv = get_incoming_version(package, timeout, http_proxy, arch)
-        if iv:
-            avail['incoming'] = iv
-    stuff = get_versions_available(package, timeout, dists, http_proxy, arch)
-    avail.update(stuff)
-    if check_newqueue:
-        srcpackage = utils.get_source_name(package)
-        if srcpackage is None:
-            srcpackage = package
-        stuff = get_newqueue_available(srcpackage, timeout, dists, http_proxy, arch)
-        avail.update(stuff)
-        # print gc.garbage, stuff
 
+def compare_available(version, avail):
+    """Compare the installed version with the available ones.
+
+    :returns:
+
+        A tuple ``(avail, toonew)``, as :func:`check_available`.
+
+    """
     new = {}
 
     # Number of distributions that are outdated compared to our
@@ -326,5 +761,87 @@ def check_available(package, version, timeout, dists=None,
         elif comparison < 0:
             # Our version is newer than the available version.
             newer += 1
-    too_new = (newer and newer == len(avail))
+    too_new = newer > 0 and newer == len(avail)
     return new, too_new
+
+
+def _check_batch(batch, timeout, dists, http_proxy, newqueue, local_only):
+    versions = {}
+    missing = {}
+    index = get_apt_version_index(wait=local_only)
+    for package, version, source in batch:
+        if index is not None:
+            versions[package], pkgmissing = index.lookup(package, dists)
+        else:
+            versions[package], pkgmissing = {}, list(dists)
+        if pkgmissing and not local_only:
+            missing.setdefault(tuple(pkgmissing), []).append(package)
+
+    # one query for all the packages missing the same dists
+    queries = 0
+    for pkgmissing, packages in missing.items():
+        found = query_madison(packages, pkgmissing, timeout, http_proxy)
+        queries += 1
+        for package in packages:
+            versions[package].update(found.get(package, {}))
+
+    results = []
+    for package, version, source in batch:
+        avail = versions[package]
+        if newqueue is not None:
+            avail.update(newqueue.versions(source))
+        results.append((package, version) + compare_available(version, avail))
+    return results, queries
+
+
+def check_available_many(packages, timeout, dists=None, check_newqueue=True,
+                         http_proxy=None, local_only=False, jobs=AUDIT_JOBS,
+                         batch=MADISON_BATCH, stats=None):
+    """Check the available versions of many packages, as check_available.
+
+    The local APT lists are used first; madison is then asked about
+    ``batch`` packages per query, up to ``jobs`` queries at once, and
+    new.822 is fetched once for all the packages.
+
+    :param packages:
+
+        The ``(package, version)`` or ``(package, version, source)``
+        tuples to check; the source package defaults to the package.
+
+    :param stats:
+
+        If given, a dict where the number of ``packages`` checked and of
+        madison ``queries`` made are counted.
+
+    :returns:
+
+        An iterator over ``(package, version, avail, toonew)`` tuples,
+        in the order of packages, as soon as they are available.
+
+    """
+    if not dists:
+        dists = ('oldstable', 'stable', 'testing', 'unstable', 'experimental')
+    if stats is None:
+        stats = {}
+    stats.setdefault('packages', 0)
+    stats.setdefault('queries', 0)
+
+    packages = [(p[0], p[1], p[2] if len(p) > 2 and p[2] else p[0]) for p in packages]
+    newqueue = None
+    if check_newqueue and not local_only:
+        newqueue = get_newqueue_versions(timeout, http_proxy)
+
+    batches = [packages[i:i + batch] for i in range(0, len(packages), batch)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_check_batch, b, timeout, dists, http_proxy,
+                                   newqueue, local_only) for b in batches]
+        try:
+            for future in futures:
+                results, queries = future.result()
+                stats['queries'] += queries
+                for result in results:
+                    stats['packages'] += 1
+                    yield result
+        finally:
+            for future in futures:
+                future.cancel()
@@ -25,15 +25,29 @@ from . import utils
 import sys
 import email
 import email.errors
+import email.parser
+import email.policy
 import glob
+import io
 import os
+import re
+import json
+import time
+import sqlite3
+import tempfile
+import datetime
+import threading
+import zlib
 import urllib.parse
 import textwrap
 # SOAP interface to Debian BTS
 import debianbts
-from collections import defaultdict
+import concurrent.futures
+from collections import defaultdict, deque
 
 from . import checkversions
+from . import urlutils
+from .exceptions import NoNetwork
 
 
 class Error(Exception):
@@ -919,10 +933,12 @@ def handle_upgrade_report(package, bts, ui, fromaddr, timeout, online=True, http
     return (subject, severity, headers, pseudos, body, query)
 
 
-def dpkg_infofunc():
-    debarch = utils.get_arch()
+def dpkg_infofunc(facts=None):
+    if facts is None:
+        facts = utils.SystemFacts(INFOFUNC_PROBES[dpkg_infofunc])
+    debarch = facts.get('arch')
     utsmachine = os.uname()[4]
-    multiarch = utils.get_multiarch()
+    multiarch = facts.get('multiarch')
     if debarch:
         if utsmachine == debarch:
             debinfo = 'Architecture: %s\n' % debarch
@@ -936,17 +952,32 @@ def dpkg_infofunc():
     return debinfo
 
 
-def debian_infofunc():
-    return utils.get_debian_release_info() + dpkg_infofunc()
+def debian_infofunc(facts=None):
+    if facts is None:
+        facts = utils.SystemFacts(INFOFUNC_PROBES[debian_infofunc])
+    return facts.get('debian_release') + dpkg_infofunc(facts)
 
 
-def ubuntu_infofunc():
-    return utils.lsb_release_info() + dpkg_infofunc()
+def ubuntu_infofunc(facts=None):
+    if facts is None:
+        facts = utils.SystemFacts(INFOFUNC_PROBES[ubuntu_infofunc])
+    return facts.get('lsb_release') + dpkg_infofunc(facts)
 
 
-def generic_infofunc():
+def generic_infofunc(facts=None):
+    if facts is None:
+        facts = utils.SystemFacts(INFOFUNC_PROBES[generic_infofunc])
     utsmachine = os.uname()[4]
-    return utils.lsb_release_info() + 'Architecture: %s\n\n' % utsmachine
+    return facts.get('lsb_release') + 'Architecture: %s\n\n' % utsmachine
+
+
+# the utils.SYSTEM_PROBES read by each infofunc
+INFOFUNC_PROBES = {
+    dpkg_infofunc: ('arch', 'multiarch'),
+    debian_infofunc: ('debian_release', 'arch', 'multiarch'),
+    ubuntu_infofunc: ('lsb_release', 'arch', 'multiarch'),
+    generic_infofunc: ('lsb_release',),
+}
 
 
 # Supported servers
@@ -1138,35 +1169,191 @@ for origin in glob.glob('/etc/dpkg/origins/*'):
         pass
 
 
+# SOAP calls made to the BTS at once, and bugs asked per get_status call
+BTS_JOBS = 8
+STATUS_BATCH = 100
+
+
+def system_probes(system):
+    """Return the names of the utils.SYSTEM_PROBES a report to system
+    shows in its System Information section"""
+    infofunc = SYSTEMS[system].get('infofunc', generic_infofunc)
+    return utils.REPORT_PROBES + INFOFUNC_PROBES.get(infofunc, ())
+
+
+def _bts_map(func, items, jobs=BTS_JOBS):
+    """Return [func(item) for item in items], running the calls at once"""
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+# a bug status is used without asking the BTS for BUG_CACHE_TTL seconds;
+# closed or archived bugs whose log didn't change for a long time, which
+# are unlikely to change now, for longer: a tenth of that time, up to
+# BUG_CACHE_MAX_TTL; unused entries are dropped after BUG_CACHE_EXPIRE
+BUG_CACHE_TTL = 900
+BUG_CACHE_MAX_TTL = 86400
+BUG_CACHE_EXPIRE = 30 * 86400
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class BugStatusCache(object):
+    """Persistent cache of the bug statuses returned by the BTS.
+
+    The Bugreport fields are kept by bug number, with when they were
+    fetched, the log_modified date of the bug and whether it is closed:
+    only new bugs, and the ones past their TTL, are asked again to the BTS.
+
+    Only the bug listings of get_reports() are served from it; the bug
+    opened or followed up, through get_report(), is always asked again."""
+
+    version = 2
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(utils.CACHEDIR, 'bugs.sqlite')
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.db = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)')
+        with self.db:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not row or row[0] != self.version:
+                self.db.execute('DROP TABLE IF EXISTS bugs')
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+            self.db.execute('CREATE TABLE IF NOT EXISTS bugs (bug_num INTEGER PRIMARY KEY, '
+                            'log_modified REAL, closed INTEGER, fetched REAL, used REAL, status TEXT)')
+            self.db.execute('DELETE FROM bugs WHERE used < ?', (time.time() - BUG_CACHE_EXPIRE,))
+
+    @staticmethod
+    def dumps(bug):
+        fields = {}
+        for key, value in bug.__dict__.items():
+            if isinstance(value, datetime.datetime):
+                value = {'datetime': value.isoformat()}
+            fields[key] = value
+        return json.dumps(fields)
+
+    @staticmethod
+    def loads(status):
+        bug = debianbts.Bugreport()
+        for key, value in json.loads(status).items():
+            if isinstance(value, dict) and 'datetime' in value:
+                value = datetime.datetime.fromisoformat(value['datetime'])
+            setattr(bug, key, value)
+        return bug
+
+    @staticmethod
+    def ttl(log_modified, fetched, closed):
+        if not closed:
+            # an open bug may be closed or retitled any time
+            return BUG_CACHE_TTL
+        return max(BUG_CACHE_TTL, min(BUG_CACHE_MAX_TTL, (fetched - log_modified) / 10))
+
+    def get(self, bugs, now=None):
+        """Return the statuses in the cache, and still fresh, of bugs, as a
+        dict of bug number -> Bugreport"""
+        now = now or time.time()
+        found = {}
+        with self.lock:
+            for i in range(0, len(bugs), 500):
+                batch = bugs[i:i + 500]
+                rows = self.db.execute('SELECT bug_num, log_modified, closed, fetched, status '
+                                       'FROM bugs WHERE bug_num IN (%s)' % ','.join('?' * len(batch)),
+                                       batch).fetchall()
+                for bug_num, log_modified, closed, fetched, status in rows:
+                    if now - fetched < self.ttl(log_modified, fetched, closed):
+                        found[bug_num] = self.loads(status)
+            with self.db:
+                self.db.executemany('UPDATE bugs SET used = ? WHERE bug_num = ?',
+                                    ((now, bug_num) for bug_num in found))
+        return found
+
+    def store(self, statuses, now=None):
+        now = now or time.time()
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO bugs VALUES (?, ?, ?, ?, ?, ?)',
+                                ((bug.bug_num, (bug.log_modified - _EPOCH).total_seconds(),
+                                  bool(getattr(bug, 'done', False) or getattr(bug, 'archived', False)),
+                                  now, now, self.dumps(bug)) for bug in statuses))
+
+    def invalidate(self, bugs=None):
+        """Forget the given bugs, or all of them"""
+        with self.lock, self.db:
+            if bugs is None:
+                self.db.execute('DELETE FROM bugs')
+            else:
+                self.db.executemany('DELETE FROM bugs WHERE bug_num = ?', ((bug,) for bug in bugs))
+
+
+_bug_status_cache = None
+
+
+def get_bug_status_cache():
+    """Return the (shared) BugStatusCache"""
+    global _bug_status_cache
+
+    if _bug_status_cache is None:
+        try:
+            _bug_status_cache = BugStatusCache()
+        except (OSError, sqlite3.Error):
+            # no usable cache directory: keep the cache in memory
+            _bug_status_cache = BugStatusCache(':memory:')
+    return _bug_status_cache
+
+
+def get_status(bugs, cached=True):
+    """Return the Bugreports of bugs, as debianbts.get_status() does,
+    fetching only those which aren't in the cache, in parallel batches.
+
+    With cached=False, all of them are fetched again (and cached): e.g.
+    for a bug being opened, whose done/forwarded state and log_modified
+    date have to be current."""
+    cache = get_bug_status_cache()
+    statuses = cache.get(bugs) if cached else {}
+    missing = [bug for bug in bugs if bug not in statuses]
+    batches = [missing[i:i + STATUS_BATCH] for i in range(0, len(missing), STATUS_BATCH)]
+    fetched = [s for batch in _bts_map(debianbts.get_status, batches) for s in batch]
+    cache.store(fetched)
+    return list(statuses.values()) + fetched
+
+
+def _package_queries(package, source):
+    """The get_bugs() queries for the reports on a package"""
+    if source:
+        return [{'src': package}, {'affects': 'src:' + package}]
+    return [{'package': package}, {'affects': package}]
+
+
 def get_reports(package, timeout, system='debian', mirrors=None, version=None,
                 http_proxy='', archived=False, source=False):
     if system == 'debian':
+        bugs = []
         if isinstance(package, str):
-            if source:
-                bugs = debianbts.get_bugs(src=package)
-                bugs += debianbts.get_bugs(affects='src:' + package)
-            else:
-                bugs = debianbts.get_bugs(package=package)
-                bugs += debianbts.get_bugs(affects=package)
+            queries = _package_queries(package, source)
         else:
-            bugs = []
+            queries = []
             for pkg in package:
                 try:
                     bugs += [int(pkg)]
                 except ValueError:
                     if pkg.startswith('src:'):
-                        bugs += debianbts.get_bugs(src=pkg[4:])
-                        bugs += debianbts.get_bugs(affects=pkg)
-                    elif source:
-                        bugs += debianbts.get_bugs(src=pkg)
-                        bugs += debianbts.get_bugs(affects='src:' + pkg)
+                        queries += [{'src': pkg[4:]}, {'affects': pkg}]
                     else:
-                        bugs += debianbts.get_bugs(package=pkg)
-                        bugs += debianbts.get_bugs(affects=pkg)
+                        queries += _package_queries(pkg, source)
 
-        bugs = list(set(bugs))
+        # all the queries run at once, the results are merged in order
+        for found in _bts_map(lambda query: debianbts.get_bugs(**query), queries):
+            bugs += found
+
+        bugs = sorted(set(bugs))
         # retrieve bugs and generate the hierarchy
-        stats = debianbts.get_status(bugs)
+        stats = get_status(bugs)
+        stats.sort(key=lambda s: s.bug_num)
 
         d = defaultdict(list)
         for s in stats:
@@ -1189,25 +1376,532 @@ def get_reports(package, timeout, system='debian', mirrors=None, version=None,
     raise Error(f"Getting bugs from {system} is not supported")
 
 
+def format_log_message(headers, body):
+    """Return a message of a bug log as shown to the user: its body,
+    preceded by its Date, From and Subject headers"""
+    hdrs = []
+    for i in ['Date', 'Subject', 'From']:
+        if i in headers:
+            hdrs.append(i + ': ' + headers.get(i))
+    return '\n'.join(sorted(hdrs)) + '\n\n' + body
+
+
+def split_mbox(lines):
+    """Yield the messages of an mbox, given as an iterable of byte lines, as
+    soon as each message is complete.
+
+    The messages are kept as they are in the mbox, "From " line included."""
+    message = []
+    blank = True
+    for line in lines:
+        if line.startswith(b'From ') and blank:
+            if message:
+                yield b''.join(message)
+            message = [line]
+        elif message:
+            message.append(line)
+        blank = not line.strip()
+    if message:
+        yield b''.join(message)
+
+
+def parse_mbox_message(message):
+    """Return the headers, as an email.message.Message, and the body, as a
+    string, of a message from split_mbox()"""
+    lines = list(io.BytesIO(message))[1:]
+    # the blank line before the next "From " line belongs to the mbox
+    if lines and not lines[-1].strip():
+        lines.pop()
+    for i, line in enumerate(lines):
+        if not line.strip():
+            break
+    else:
+        i = len(lines)
+    body = b''.join(line[1:] if re.match(rb'>+From ', line) else line
+                    for line in lines[i + 1:])
+    headers = email.parser.BytesParser(policy=email.policy.SMTP).parsebytes(
+        b''.join(lines[:i]) + b'\n' + body)
+    if not headers.is_multipart():
+        # undo the Content-Transfer-Encoding, as the SOAP interface does
+        body = headers.get_payload(decode=True)
+    charset = headers.get_content_charset() or 'utf-8'
+    try:
+        return headers, body.decode(charset, errors='replace')
+    except LookupError:
+        return headers, body.decode('utf-8', errors='replace')
+
+
+def parse_mbox(lines):
+    """Yield the (headers, body) of the messages of an mbox, given as an
+    iterable of byte lines, as soon as each message is complete"""
+    for message in split_mbox(lines):
+        yield parse_mbox_message(message)
+
+
+# byte budget of the BugLogStore; the least recently used logs go first
+BUG_LOG_STORE_SIZE = 64 << 20
+
+
+class BugLogStore(object):
+    """Persistent store of the bug logs downloaded from the BTS.
+
+    The messages of the mbox of a bug are kept zlib-compressed, by bug
+    tracking system, bug number and archived flag, with the log_modified
+    date of the bug they were fetched for: a log is only downloaded again
+    once the bug has changed.  The store is kept under maxsize bytes of
+    compressed messages."""
+
+    version = 2
+
+    # the columns identifying a log
+    key = 'system = ? AND bug_num = ? AND archived = ?'
+
+    def __init__(self, filename=None, maxsize=BUG_LOG_STORE_SIZE):
+        if filename is None:
+            filename = os.path.join(utils.CACHEDIR, 'buglogs.sqlite')
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.maxsize = maxsize
+        self.db = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.db:
+            row = None
+            if self.db.execute("SELECT name FROM sqlite_master WHERE name = 'meta'").fetchone():
+                row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not row or row[0] != self.version:
+                self.db.execute('DROP TABLE IF EXISTS logs')
+                self.db.execute('DROP TABLE IF EXISTS messages')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS logs (system TEXT, bug_num INTEGER, archived INTEGER,
+                                             log_modified REAL, used REAL, size INTEGER,
+                                             PRIMARY KEY (system, bug_num, archived));
+            CREATE TABLE IF NOT EXISTS messages (system TEXT, bug_num INTEGER, archived INTEGER,
+                                                 idx INTEGER, data BLOB,
+                                                 PRIMARY KEY (system, bug_num, archived, idx));
+        ''')
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+
+    @staticmethod
+    def timestamp(log_modified):
+        return (log_modified - _EPOCH).total_seconds()
+
+    def get(self, number, log_modified=None, now=None, system='debian', archived=False):
+        """Return the stored messages of a bug, as a list of bytes, or None
+        if the log isn't there or was stored for another log_modified date.
+
+        Without log_modified, whatever log there is is returned."""
+        key = (system, number, yn_bool(archived) == 'yes')
+        with self.lock:
+            row = self.db.execute('SELECT log_modified FROM logs WHERE ' + self.key, key).fetchone()
+            if not row:
+                return None
+            if log_modified is not None and row[0] != self.timestamp(log_modified):
+                return None
+            rows = self.db.execute('SELECT data FROM messages WHERE ' + self.key + ' ORDER BY idx',
+                                   key).fetchall()
+            with self.db:
+                self.db.execute('UPDATE logs SET used = ? WHERE ' + self.key,
+                                (now or time.time(),) + key)
+        return [zlib.decompress(data) for (data,) in rows]
+
+    def store(self, number, log_modified, messages, now=None, system='debian', archived=False):
+        self.store_compressed(number, log_modified,
+                              [zlib.compress(message) for message in messages], now,
+                              system, archived)
+
+    def store_compressed(self, number, log_modified, compressed, now=None,
+                         system='debian', archived=False):
+        """Store the messages of a log, already zlib-compressed"""
+        key = (system, number, yn_bool(archived) == 'yes')
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM messages WHERE ' + self.key, key)
+            self.db.execute('INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?, ?)',
+                            key + (self.timestamp(log_modified), now or time.time(),
+                                   sum(len(data) for data in compressed)))
+            self.db.executemany('INSERT INTO messages VALUES (?, ?, ?, ?, ?)',
+                                (key + (idx, data) for idx, data in enumerate(compressed)))
+            self._evict()
+
+    def _delete(self, key):
+        self.db.execute('DELETE FROM logs WHERE ' + self.key, key)
+        self.db.execute('DELETE FROM messages WHERE ' + self.key, key)
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM logs').fetchone()[0]
+        if total <= self.maxsize:
+            return
+        for row in self.db.execute('SELECT system, bug_num, archived, size FROM logs '
+                                   'ORDER BY used').fetchall():
+            if total <= self.maxsize:
+                break
+            self._delete(row[:3])
+            total -= row[3]
+
+    def invalidate(self, bugs=None, system='debian'):
+        """Forget the logs of the given bugs, or all of them"""
+        with self.lock, self.db:
+            if bugs is None:
+                self.db.execute('DELETE FROM logs')
+                self.db.execute('DELETE FROM messages')
+            else:
+                for bug in bugs:
+                    for archived in (False, True):
+                        self._delete((system, bug, archived))
+
+
+_bug_log_store = None
+
+
+def get_bug_log_store():
+    """Return the (shared) BugLogStore"""
+    global _bug_log_store
+
+    if _bug_log_store is None:
+        try:
+            _bug_log_store = BugLogStore()
+        except (OSError, sqlite3.Error):
+            # no usable cache directory: keep the logs in memory
+            _bug_log_store = BugLogStore(':memory:')
+    return _bug_log_store
+
+
+def iter_bug_mbox(number, timeout, system='debian', mirrors=None,
+                  http_proxy='', archived=False, log_modified=None):
+    """Yield the messages of the mbox of a bug, as bytes, from the
+    BugLogStore or while the mbox is downloaded.
+
+    log_modified is looked up if not given; the downloaded log is stored
+    once it was read completely.  A stored log whose date can't be
+    checked is only used when the BTS can't be reached."""
+    number = int(number)
+    offline = False
+    if log_modified is None and system == 'debian':
+        try:
+            statuses = get_status([number], cached=False)
+        except Exception:
+            offline = True
+        else:
+            if statuses:
+                log_modified = statuses[0].log_modified
+
+    store = get_bug_log_store()
+    if log_modified is not None or offline:
+        messages = store.get(number, log_modified, system=system, archived=archived)
+        if messages is not None:
+            yield from messages
+            return
+
+    url = get_report_url(system, number, mirrors, archived, mbox=True)
+    if not url:
+        return
+    # only the compressed messages are kept for the store, and none once
+    # the log is past its budget: it wouldn't stay there anyway
+    compressed = []
+    size = 0
+    for message in split_mbox(urlutils.iter_url_lines(url, http_proxy, timeout)):
+        if compressed is not None:
+            compressed.append(zlib.compress(message))
+            size += len(compressed[-1])
+            if size > store.maxsize:
+                compressed = None
+        yield message
+    if compressed and log_modified is not None:
+        store.store_compressed(number, log_modified, compressed, system=system,
+                               archived=archived)
+
+
+# mboxes downloaded at once by get_mboxes()
+MBOX_JOBS = 4
+# messages of the mbox being read handed over ahead of the reader
+MBOX_STREAM_QUEUE = 16
+
+
+class _MboxSpool(object):
+    """The messages of a bug mbox downloaded by a get_mboxes() worker.
+
+    Until the mbox is read, the messages are spooled to a temporary file;
+    once its reader comes, they are read back from there and the rest of
+    the download is handed over directly, through a short queue."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.file = None
+        self.sizes = []
+        self.queue = deque()
+        self.streaming = False
+        self.closed = False
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def fill(self, number, timeout, system, mirrors, http_proxy, archived, log_modified):
+        if self.closed:
+            # given up before its turn came
+            return
+        messages = iter_bug_mbox(number, timeout, system, mirrors, http_proxy,
+                                 archived, log_modified)
+        try:
+            for message in messages:
+                with self.cond:
+                    while (self.streaming and len(self.queue) >= MBOX_STREAM_QUEUE
+                           and not self.closed):
+                        self.cond.wait()
+                    if self.closed:
+                        break
+                    if self.streaming:
+                        self.queue.append(message)
+                        self.cond.notify_all()
+                    else:
+                        if self.file is None:
+                            self.file = tempfile.TemporaryFile()
+                        self.file.write(message)
+                        self.sizes.append(len(message))
+        except Exception as exc:
+            self.error = exc
+        finally:
+            messages.close()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+            if self.closed and self.file is not None:
+                self.file.close()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.file is not None and self.done:
+            self.file.close()
+
+    def _count(self, message):
+        self.stats['messages'] += 1
+        self.stats['bytes'] += len(message)
+
+    def __iter__(self):
+        with self.cond:
+            # from now on, the spooled messages don't change
+            self.streaming = True
+        try:
+            if self.file is not None:
+                self.file.seek(0)
+                for size in self.sizes:
+                    message = self.file.read(size)
+                    self._count(message)
+                    yield message
+                self.file.close()
+            while True:
+                with self.cond:
+                    while not self.queue and not self.done:
+                        self.cond.wait()
+                    if not self.queue:
+                        break
+                    message = self.queue.popleft()
+                    self.cond.notify_all()
+                self._count(message)
+                yield message
+        finally:
+            self.close()
+        if self.error:
+            self.stats['errors'] += 1
+
+
+def get_mboxes(numbers, timeout, system='debian', mirrors=None, http_proxy='',
+               archived=False, jobs=MBOX_JOBS, stats=None):
+    """Download the mboxes of many bugs, up to jobs at once.
+
+    The mbox being read is streamed while it is downloaded; the few ones
+    downloaded ahead of it are spooled to temporary files meanwhile.
+
+    :param stats:
+
+        If given, a dict where the number of ``bugs``, ``messages`` and
+        ``bytes`` read, and of ``errors``, are counted.
+
+    :returns:
+
+        An iterator over ``(number, mbox)`` tuples, in the order of
+        numbers: iterating over mbox yields the messages of the bug, as
+        bytes, as soon as they are available, after which its ``error``
+        attribute is the exception which stopped the download, or None.
+        Each mbox must be read before the next tuple is asked for.
+
+    """
+    if stats is None:
+        stats = {}
+    for key in ('bugs', 'messages', 'bytes', 'errors'):
+        stats.setdefault(key, 0)
+
+    numbers = [int(number) for number in numbers]
+    modified = {}
+    if system == 'debian':
+        try:
+            modified = {bug.bug_num: bug.log_modified for bug in get_status(numbers, cached=False)}
+        except Exception:
+            # each download looks it up again
+            pass
+
+    pending = iter(numbers)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        spools = deque()
+
+        def submit():
+            number = next(pending, None)
+            if number is not None:
+                spool = _MboxSpool(stats)
+                executor.submit(spool.fill, number, timeout, system, mirrors, http_proxy,
+                                archived, modified.get(number))
+                spools.append((number, spool))
+
+        for i in range(2 * jobs):
+            submit()
+        try:
+            while spools:
+                number, spool = spools[0]
+                stats['bugs'] += 1
+                yield number, spool
+                spools.popleft()
+                spool.close()
+                submit()
+        finally:
+            for number, spool in spools:
+                spool.close()
+
+
+def iter_bug_log(number, timeout, system='debian', mirrors=None,
+                 http_proxy='', archived=False, log_modified=None):
+    """Yield the messages of a bug log, formatted by format_log_message(),
+    while the mbox of the bug is downloaded, or from the BugLogStore.
+
+    The SOAP interface, which returns the whole log at once, is only used
+    when the mbox can't be retrieved; a download failing partway raises
+    NoNetwork after the messages received."""
+    found = False
+    try:
+        for message in iter_bug_mbox(number, timeout, system, mirrors, http_proxy,
+                                     archived, log_modified):
+            found = True
+            yield format_log_message(*parse_mbox_message(message))
+    except NoNetwork:
+        if found:
+            raise
+    if found:
+        return
+
+    if system == 'debian':
+        for lm in debianbts.get_bug_log(number):
+            yield format_log_message(lm['message'], lm['body'])
+
+
+class BugLog(object):
+    """The messages of a bug log, read from an iterator in a background
+    thread, started on first use.
+
+    Indexing and iterating only wait for the messages they need, so the
+    first message can be shown while the followups are still arriving;
+    len() waits for the whole log.
+
+    When reading fails after some messages, a last message says that the
+    log is truncated, and why."""
+
+    def __init__(self, messages):
+        self.source = messages
+        self.messages = []
+        self.complete = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        """Start reading the messages, if not done yet"""
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._read, name='buglog',
+                                               daemon=True)
+                self.thread.start()
+
+    def _read(self):
+        error = None
+        try:
+            for message in self.source:
+                with self.cond:
+                    self.messages.append(message)
+                    self.cond.notify_all()
+        except Exception as exc:
+            error = exc
+        with self.cond:
+            if error and self.messages:
+                self.messages.append('[The log is truncated: the rest of it could not be '
+                                     'retrieved (%s).]' % (str(error) or error.__class__.__name__))
+            self.complete = True
+            self.error = error
+            self.cond.notify_all()
+
+    def fetched(self):
+        """Return the number of messages read so far, without waiting"""
+        self.start()
+        with self.cond:
+            return len(self.messages)
+
+    def has(self, index):
+        """Whether the log has a message at index, waiting only until it
+        arrives or the log is complete.
+
+        Errors while reading the log are raised if no message came before,
+        otherwise they end the log with a "truncated" message."""
+        self.start()
+        with self.cond:
+            self.cond.wait_for(lambda: self.complete or len(self.messages) > index)
+            if self.error and not self.messages:
+                raise self.error
+            return len(self.messages) > index
+
+    def wait(self):
+        """Wait until the whole log is read"""
+        self.start()
+        with self.cond:
+            self.cond.wait_for(lambda: self.complete)
+            if self.error and not self.messages:
+                raise self.error
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            self.wait()
+        elif not self.has(index):
+            raise IndexError('bug log index out of range')
+        return self.messages[index]
+
+    def __iter__(self):
+        index = 0
+        while self.has(index):
+            yield self.messages[index]
+            index += 1
+
+    def __len__(self):
+        self.wait()
+        return len(self.messages)
+
+    def __bool__(self):
+        return self.has(0)
+
+
 def get_report(number, timeout, system='debian', mirrors=None,
                http_proxy='', archived=False, followups=False):
+    """Return the status of a bug and a BugLog of its messages.
+
+    The log is only downloaded once its messages are looked at."""
     number = int(number)
 
     if system == 'debian':
-        status = debianbts.get_status([number])[0]
-        log = debianbts.get_bug_log(number)
-
-        # add Date/Subject/From headers to the msg bodies
-        bodies = []
-        for lm in log:
-            h = lm['message']
-            hdrs = []
-            for i in ['Date', 'Subject', 'From']:
-                if i in h:
-                    hdrs.append(i + ': ' + h.get(i))
-            bodies.append('\n'.join(sorted(hdrs)) + '\n\n' + lm['body'])
-
-        # returns the bug status and a list of mail bodies
-        return (status, bodies)
+        # not from the cache, which is meant for the listings: the bug is
+        # opened or followed up, so its state has to be current (and the
+        # log is only fetched again if it changed)
+        status = get_status([number], cached=False)[0]
+        log = BugLog(iter_bug_log(number, timeout, system, mirrors,
+                                  http_proxy, archived, status.log_modified))
+
+        # returns the bug status and the mail bodies
+        return (status, log)
 
     return None
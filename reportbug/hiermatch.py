@@ -6,18 +6,30 @@
 import re
 from . import exceptions
 
+# characters which make a pattern more than a plain string
+_REGEX_CHARS = re.compile(r'[\\.^$*+?{}\[\]|()]')
+
+
+def compile_pattern(pattern_str):
+    """Compile pattern_str as the searches do: case-insensitive, multiline."""
+    try:
+        return re.compile(pattern_str, re.I | re.M)
+    except:
+        raise exceptions.InvalidRegex
+
 
 def egrep_list(strlist, pattern_str, subindex=None):
-    """Use the pattern_str to find any match in a list of strings."""
-    """Return: a list of index for the matches into the origin list."""
+    """Use the pattern_str to find any match in a list of strings.
+
+    Return: a list of index for the matches into the origin list."""
 
     if strlist is None:
         return None
 
-    try:
-        pat = re.compile(pattern_str, re.I | re.M)
-    except:
-        raise exceptions.InvalidRegex
+    if isinstance(pattern_str, re.Pattern):
+        pat = pattern_str
+    else:
+        pat = compile_pattern(pattern_str)
 
     resultlist = []
     if subindex is None:
@@ -29,31 +41,91 @@ def egrep_list(strlist, pattern_str, subindex=None):
 
 
 def egrep_hierarchy(hier, pattern_str, subhier=None, nth=1):
-    """Grep the nth item of a hierarchy [(x, [a, b]),...]."""
-    """Return a subhier like [[n, m],[],...], n, m string index."""
+    """Grep the nth item of a hierarchy [(x, [a, b]),...].
+
+    Given a subhier, only the strings it lists are searched.
+    Return a subhier like [[n, m],[],...], n, m string index."""
     resulthier = []
+    pat = compile_pattern(pattern_str)
 
     for i in range(len(hier)):
         if subhier:
             if subhier[i]:  # Only if have something to match.
-                resultlist = egrep_list(hier[i][nth], pattern_str, subhier[i])
+                resultlist = egrep_list(hier[i][nth], pat, subhier[i])
             else:
                 resultlist = []
         else:
-            resultlist = egrep_list(hier[i][nth], pattern_str)
+            resultlist = egrep_list(hier[i][nth], pat)
 
         resulthier.append(resultlist)
     return resulthier
 
 
-def matched_hierarchy(hier, pattern_str):
+def matched_hierarchy(hier, pattern_str, subhier=None):
     """Actually create a new hierarchy from a pattern matching."""
     mhier = []
-    result = egrep_hierarchy(hier, pattern_str)
+    result = egrep_hierarchy(hier, pattern_str, subhier)
     for i in range(len(result)):
         if result[i]:
             item = [hier[i][1][y] for y in result[i]]
             mhier.append((hier[i][0], item))
     return mhier
 
+
+class HierarchyIndex(object):
+    """Search index over a bug hierarchy [(title, ['#n  subject', ...]), ...].
+
+    The strings are kept lowercased in a flat list, next to the bug numbers
+    read from them.  Searches return a subhier, as egrep_hierarchy() does,
+    which a further search can narrow instead of scanning everything."""
+
+    numberre = re.compile(r'#(\d+)[ :]')
+
+    def __init__(self, hier, nth=1):
+        self.hier = hier
+        self.nth = nth
+        self.texts = []
+        self.numbers = []
+        self.offsets = []
+        for entry in hier:
+            self.offsets.append(len(self.texts))
+            for item in entry[nth]:
+                self.texts.append(item.lower())
+                match = self.numberre.match(item)
+                self.numbers.append(int(match.group(1)) if match else None)
+
+    def search(self, pattern_str, subhier=None):
+        """Return the subhier of the strings matching pattern_str, among
+        those of subhier if given."""
+        pat = compile_pattern(pattern_str)
+        if _REGEX_CHARS.search(pattern_str):
+            match = pat.search
+        else:
+            # a plain string: no need for the regex engine
+            needle = pattern_str.lower()
+
+            def match(text):
+                return needle in text
+
+        resulthier = []
+        for i, offset in enumerate(self.offsets):
+            if subhier is None:
+                candidates = range(len(self.hier[i][self.nth]))
+            else:
+                candidates = subhier[i]
+            resulthier.append([j for j in candidates if match(self.texts[offset + j])])
+        return resulthier
+
+    def hierarchy(self, subhier):
+        """Return the hierarchy of the strings of subhier, without the
+        empty categories."""
+        return [(entry[0], [entry[self.nth][j] for j in subhier[i]])
+                for i, entry in enumerate(self.hier) if subhier[i]]
+
+    def bugs(self, subhier):
+        """Return the bug numbers of the strings of subhier, in order."""
+        return [self.numbers[offset + j]
+                for offset, indexes in zip(self.offsets, subhier) for j in indexes
+                if self.numbers[offset + j] is not None]
+
 # vim:ts=8:sw=4:expandtab:
@@ -0,0 +1,182 @@
+#
+# integrity.py - Verify the integrity of installed packages, as debsums does
+#
+# This program is freely distributable per the following license:
+#
+#  Permission to use, copy, modify, and distribute this software and its
+#  documentation for any purpose and without fee is hereby granted,
+#  provided that the above copyright notice appears in all copies and that
+#  both that copyright notice and this permission notice appear in
+#  supporting documentation.
+#
+#  I DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING ALL
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT SHALL I
+#  BE LIABLE FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY
+#  DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+#  WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+#  SOFTWARE.
+
+import os
+import re
+import glob
+import fnmatch
+import concurrent.futures
+
+from . import utils
+
+DPKG_INFO_DIR = '/var/lib/dpkg/info'
+DPKG_DIVERSIONS = '/var/lib/dpkg/diversions'
+DPKG_CFG_FILES = ['/etc/dpkg/dpkg.cfg', '/etc/dpkg/dpkg.cfg.d/*']
+
+MD5SUM_RE = re.compile(r'[0-9a-fA-F]{32}$')
+
+
+def md5sums_file(package, infodir=DPKG_INFO_DIR, arch=None):
+    """Return the md5sums file of an installed package, or None.
+
+    Multi-Arch: same packages have their architecture in the file name,
+    the package can be given with or without it; without, the one of the
+    native architecture (or arch) is preferred."""
+    filename = os.path.join(infodir, package + '.md5sums')
+    if os.path.exists(filename):
+        return filename
+
+    if ':' not in package:
+        candidates = sorted(glob.glob(os.path.join(infodir, glob.escape(package) + ':*.md5sums')))
+        if len(candidates) > 1:
+            native = os.path.join(infodir, '%s:%s.md5sums' % (package, arch or utils.get_arch()))
+            if native in candidates:
+                return native
+        if candidates:
+            return candidates[0]
+    return None
+
+
+def read_md5sums(filename, invalid=None):
+    """Return the (path, md5sum) pairs listed in a md5sums file.
+
+    Malformed lines are skipped; if invalid is a list, their numbers are
+    appended to it."""
+    md5sums = []
+    with open(filename, errors='surrogateescape') as fp:
+        for lineno, line in enumerate(fp, 1):
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            fields = line.split(None, 1)
+            if len(fields) != 2 or not MD5SUM_RE.match(fields[0]):
+                if invalid is not None:
+                    invalid.append(lineno)
+                continue
+            md5sum, path = fields
+            md5sums.append(('/' + path.lstrip('/'), md5sum))
+    return md5sums
+
+
+def get_diversions(filename=DPKG_DIVERSIONS):
+    """Return a dict of diverted file -> (diverted to, diverting package)"""
+    diversions = {}
+    try:
+        with open(filename, errors='surrogateescape') as fp:
+            lines = fp.read().splitlines()
+    except IOError:
+        return diversions
+
+    for i in range(0, len(lines) - 2, 3):
+        diversions[lines[i]] = (lines[i + 1], lines[i + 2])
+    return diversions
+
+
+def get_path_filters(cfgfiles=DPKG_CFG_FILES):
+    """Return dpkg's path-exclude/path-include filters, in order"""
+    filters = []
+    for pattern in cfgfiles:
+        for cfgfile in sorted(glob.glob(pattern)):
+            try:
+                with open(cfgfile, errors='surrogateescape') as fp:
+                    for line in fp:
+                        line = line.strip()
+                        if line.startswith('--'):
+                            line = line[2:]
+                        for option in ('path-exclude', 'path-include'):
+                            if line.startswith(option):
+                                value = line[len(option):].lstrip(' =')
+                                filters.append((option == 'path-exclude', value))
+            except IOError:
+                continue
+    return filters
+
+
+def is_excluded(path, filters):
+    """Whether dpkg was told not to install path; the last filter matching
+    it wins"""
+    excluded = False
+    for exclude, pattern in filters:
+        if fnmatch.fnmatchcase(path, pattern):
+            excluded = exclude
+    return excluded
+
+
+def _check_file(path, md5sum):
+    try:
+        filemd5 = utils.file_digest(path)[0]
+    except FileNotFoundError:
+        return 'missing'
+    except PermissionError:
+        # as with debsums --ignore-permissions
+        return None
+    except IsADirectoryError:
+        return None
+    except IOError as msg:
+        return msg.strerror or str(msg)
+
+    if filemd5 != md5sum:
+        return 'changed'
+    return None
+
+
+def verify_package(package, jobs=None, infodir=DPKG_INFO_DIR,
+                   diversions=None, filters=None):
+    """Verify the files of an installed package against its md5sums.
+
+    Conffiles are not checked (dpkg doesn't list them in the md5sums file),
+    files are hashed in parallel, by up to jobs threads.
+
+    Returns the list of problems found, worded as 'debsums -s' does."""
+    filename = md5sums_file(package, infodir)
+    if not filename:
+        return []
+    package = os.path.basename(filename)[:-len('.md5sums')]
+
+    if diversions is None:
+        diversions = get_diversions()
+    if filters is None:
+        filters = get_path_filters()
+
+    files = []
+    invalid = []
+    for path, md5sum in read_md5sums(filename, invalid):
+        # the file may have been moved away by another package
+        divertto, divertpkg = diversions.get(path, (None, None))
+        if divertto and divertpkg != package.split(':')[0]:
+            path = divertto
+        files.append((path, md5sum))
+
+    problems = ['debsums: invalid line %d in md5sums for %s package' % (lineno, package)
+                for lineno in invalid]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or utils.HASH_JOBS) as executor:
+        results = executor.map(_check_file, *zip(*files)) if files else []
+        for (path, md5sum), result in zip(files, results):
+            if result is None:
+                continue
+            if result == 'missing':
+                if is_excluded(path, filters):
+                    continue
+                problems.append('debsums: missing file %s (from %s package)' % (path, package))
+            elif result == 'changed':
+                problems.append('debsums: changed file %s (from %s package)' % (path, package))
+            else:
+                problems.append("debsums: can't open %s file %s (%s)" % (package, path, result))
+
+    return problems
@@ -0,0 +1,98 @@
+#
+# prefetch.py - Run the network queries of reportbug ahead of their use
+#
+# This program is freely distributable per the following license:
+#
+#  Permission to use, copy, modify, and distribute this software and its
+#  documentation for any purpose and without fee is hereby granted,
+#  provided that the above copyright notice appears in all copies and that
+#  both that copyright notice and this permission notice appear in
+#  supporting documentation.
+#
+#  I DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING ALL
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT SHALL I
+#  BE LIABLE FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY
+#  DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS,
+#  WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+#  SOFTWARE.
+
+import inspect
+import threading
+import concurrent.futures
+
+
+class Prefetcher(object):
+    """Start function calls in the background, to collect their results later.
+
+    A call is identified by the function and its arguments: result() with
+    the same arguments as a previous submit() waits for that call instead
+    of making a new one, and calls the function directly otherwise.  Each
+    result is handed out once."""
+
+    def __init__(self):
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.cancelled = False
+
+    @staticmethod
+    def key(func, args, kwargs):
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return (func, repr(sorted(bound.arguments.items())))
+
+    def submit(self, func, *args, **kwargs):
+        """Start func(*args, **kwargs) in a thread, unless it already runs.
+
+        Returns its future, or None once the prefetcher is cancelled."""
+        key = self.key(func, args, kwargs)
+        with self.lock:
+            if self.cancelled:
+                return None
+            if key in self.futures:
+                return self.futures[key]
+            future = self.futures[key] = concurrent.futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        # daemon threads: a stuck query must not block reportbug exiting
+        threading.Thread(target=run, name='prefetch-' + func.__name__,
+                         daemon=True).start()
+        return future
+
+    def result(self, func, *args, **kwargs):
+        """Return func(*args, **kwargs), from a prefetched call if any.
+
+        Exceptions raised by the call are raised here."""
+        key = self.key(func, args, kwargs)
+        with self.lock:
+            future = self.futures.pop(key, None)
+        if future is None or future.cancelled():
+            return func(*args, **kwargs)
+        return future.result()
+
+    def cancel(self):
+        """Give up on all the calls; they run on, but nobody waits for them"""
+        with self.lock:
+            self.cancelled = True
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.cancel()
+
+
+_prefetcher = None
+
+
+def get_prefetcher():
+    """Return the Prefetcher of this run"""
+    global _prefetcher
+
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    return _prefetcher
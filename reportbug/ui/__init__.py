@@ -22,12 +22,28 @@
 #  SOFTWARE.
 
 
+import importlib
+import importlib.util
+import os
+
 __all__ = ['text_ui', 'urwid_ui', 'gtk_ui']
 
 UIS = {'text': 'A text-oriented console user interface',
        'urwid': 'A menu-based console user interface',
        'gtk': 'A graphical (GTK+) user interface.'}
 
+# Modules the UIs need, checked without importing them: importing GTK
+# (through GObject introspection) alone takes a good share of the startup
+# time, so the UIs themselves are only imported on demand, by getUI()
+UI_REQUIREMENTS = {'urwid': (['urwid'],
+                             'Please install the python3-urwid package to use this interface.'),
+                   'gtk': (['gi'],
+                           'Please install the reportbug-gtk package to use this interface.')}
+
+# GObject introspection typelibs (name, version) the UIs need: gi itself
+# is cheap to import, so once found it is asked whether they are installed
+UI_TYPELIBS = {'gtk': [('Gtk', '3.0'), ('GtkSource', '4'), ('Vte', '2.91')]}
+
 # Only the available UIs
 AVAILABLE_UIS = {}
 # Reasons a UI is unavailable
@@ -36,18 +52,55 @@ UNAVAILABLE_UIS = {}
 # List of already loaded ui, we can give back to requestors
 __LOADED_UIS = {}
 
+
+def _check_ui(ui):
+    """Return the reason why the UI cannot be used, or None if it looks
+    usable (without actually importing it)"""
+
+    if ui == 'gtk' and not ('DISPLAY' in os.environ or 'WAYLAND_DISPLAY' in os.environ):
+        return 'No graphical display detected, falling back to text UI.'
+
+    modules, reason = UI_REQUIREMENTS.get(ui, ([], None))
+    for module in modules:
+        try:
+            if importlib.util.find_spec(module) is None:
+                return reason
+        except (ImportError, ValueError):
+            return reason
+
+    if ui in UI_TYPELIBS:
+        try:
+            import gi
+            repository = gi.Repository.get_default()
+            for namespace, version in UI_TYPELIBS[ui]:
+                if version not in repository.enumerate_versions(namespace):
+                    return reason
+        except Exception:
+            return reason
+    return None
+
+
 for uis in list(UIS.keys()):
-    try:
-        # let's try to import the ui...
-        ui_module = __import__('reportbug.ui', fromlist=[uis + '_ui'])
-        # ... and check if it's really imported
-        ui = getattr(ui_module, uis + '_ui')
-        # then we can finally add it to AVAILABLE_UIS
+    reason = _check_ui(uis)
+    if reason:
+        # we can't use uis, so just add it to the list of unavailable UIs
+        UNAVAILABLE_UIS[uis] = reason
+    else:
         AVAILABLE_UIS[uis] = UIS[uis]
-        __LOADED_UIS[uis] = ui
-    except Exception as e:
-        # we can't import uis, so just add it to the list of unavailable UIs
-        UNAVAILABLE_UIS[uis] = str(e)
+
+
+def _load_ui(ui):
+    """Import the UI module, if not already done"""
+
+    if ui not in __LOADED_UIS:
+        try:
+            __LOADED_UIS[ui] = importlib.import_module('reportbug.ui.%s_ui' % ui)
+        except Exception as e:
+            # it looked available, but it's not: don't try it again
+            AVAILABLE_UIS.pop(ui, None)
+            UNAVAILABLE_UIS[ui] = str(e)
+            return None
+    return __LOADED_UIS[ui]
 
 
 def getUI(ui):
@@ -55,9 +108,9 @@ def getUI(ui):
 
     if ui == 'gtk2':
         ui = 'gtk'
-    if ui in __LOADED_UIS:
+    if ui in AVAILABLE_UIS and _load_ui(ui):
         print("loading %s" % ui)
         return __LOADED_UIS[ui]
     else:
         print("defaulting to text ui")
-        return __LOADED_UIS['text']
+        return _load_ui('text')
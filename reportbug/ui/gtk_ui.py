@@ -63,10 +63,11 @@ import re
 import traceback
 from queue import Queue
 import threading
+import itertools
 import textwrap
 
 from reportbug.exceptions import NoPackage, NoBugs, QuertBTSError
-from reportbug import debbugs
+from reportbug import debbugs, prefetch
 from reportbug.urlutils import launch_browser
 
 ISATTY = True
@@ -421,11 +422,15 @@ class BugPage(Gtk.EventBox, threading.Thread):
         info = debbugs.get_report(int(self.number), self.timeout,
                                   self.bts, mirrors=self.mirrors,
                                   http_proxy=self.http_proxy, archived=self.archived)
-        if not info:
+        if not info or not info[1]:
             self.application.run_once_in_main_thread(self.not_found)
         else:
             self.bug_status = info[0]
-            self.application.run_once_in_main_thread(self.found, info)
+            # show the original report as soon as it is there, then add
+            # the followups as they arrive
+            self.application.run_once_in_main_thread(self.found, info[0], info[1][0])
+            for body in itertools.islice(info[1], 1, None):
+                self.application.run_once_in_main_thread(self.add_message, body)
 
     def drop_progressbar(self):
         _assert_context(ui_context)
@@ -445,11 +450,10 @@ class BugPage(Gtk.EventBox, threading.Thread):
         self.add(Gtk.Label(label="The bug can't be fetched or it doesn't exist."))
         self.show_all()
 
-    def found(self, info):
+    def found(self, status, body):
         _assert_context(ui_context)
         self.drop_progressbar()
-        desc = info[0].subject
-        bodies = info[1]
+        desc = status.subject
         vbox = Gtk.VBox(spacing=12)
         vbox.set_border_width(12)
         label = Gtk.Label(label='Description: ' + desc)
@@ -457,20 +461,10 @@ class BugPage(Gtk.EventBox, threading.Thread):
         label.set_justify(Gtk.Justification.FILL)
         vbox.pack_start(label, False, True, 0)
 
-        views = Gtk.VBox()
-        odd = False
-        for body in bodies:
-            view = Gtk.TextView()
-            view.set_editable(False)
-            # truncate excessively long messages
-            # without the GTK interface can crash, e.g., reportbug -u gtk -N 711404 crashes
-            # TODO: fix this properly
-            view.get_buffer().set_text(body[:10000])
-            if odd:
-                view.set_state_flags(Gtk.StateFlags.PRELIGHT, False)
-            views.pack_start(view, False, True, 0)
-            odd = not odd
-        scrolled = create_scrollable(views, True)
+        self.views = Gtk.VBox()
+        self.odd = False
+        self.add_message(body)
+        scrolled = create_scrollable(self.views, True)
         vbox.pack_start(scrolled, True, True, 0)
 
         bbox = Gtk.HButtonBox()
@@ -487,6 +481,20 @@ class BugPage(Gtk.EventBox, threading.Thread):
         self.add(vbox)
         self.show_all()
 
+    def add_message(self, body):
+        _assert_context(ui_context)
+        view = Gtk.TextView()
+        view.set_editable(False)
+        # truncate excessively long messages
+        # without the GTK interface can crash, e.g., reportbug -u gtk -N 711404 crashes
+        # TODO: fix this properly
+        view.get_buffer().set_text(body[:10000])
+        if self.odd:
+            view.set_state_flags(Gtk.StateFlags.PRELIGHT, False)
+        self.views.pack_start(view, False, True, 0)
+        view.show_all()
+        self.odd = not self.odd
+
     def on_open_browser(self, button):
         _assert_context(ui_context)
         launch_browser(debbugs.get_report_url(self.bts, int(self.number), self.archived))
@@ -1051,7 +1059,8 @@ class HandleBTSQueryPage(TreePage):
         self.application.run_once_in_main_thread(self.assistant.set_progress_label, progress_label)
 
         try:
-            (count, sectitle, hierarchy) = debbugs.get_reports(
+            (count, sectitle, hierarchy) = prefetch.get_prefetcher().result(
+                debbugs.get_reports,
                 package, timeout, bts, mirrors=mirrors, version=version,
                 http_proxy=http_proxy, archived=archived, source=source)
         except Exception as e:
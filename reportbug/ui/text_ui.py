@@ -22,7 +22,6 @@
 import sys
 import os
 import subprocess
-import re
 import math
 import string
 import errno
@@ -30,13 +29,13 @@ import glob
 import getpass
 import textwrap
 import locale
-from functools import reduce
+import bisect
 try:
     import readline
 except ImportError:
     readline = None
 
-from reportbug import debbugs, hiermatch
+from reportbug import debbugs, hiermatch, prefetch
 from reportbug.exceptions import (
     NoReport, NoPackage, NoBugs, NoNetwork, QuertBTSError,
     InvalidRegex,
@@ -107,36 +106,60 @@ if readline is not None:
 
 
 def _launch_mbox_reader(mbox_reader_cmd, bts, bugs, number, mirrors, archived,
-                        mbox, mboxmaint, http_proxy, timeout):
+                        http_proxy, timeout):
     try:
         number = int(number)
         if number not in bugs and 1 <= number <= len(bugs):
             number = bugs[number - 1]
         reportbug.utils.launch_mbox_reader(mbox_reader_cmd,
-                                           debbugs.get_report_url(bts, number, mirrors, archived, mbox, mboxmaint),
-                                           http_proxy, timeout)
+                                           debbugs.iter_bug_mbox(number, timeout, bts, mirrors,
+                                                                 http_proxy, archived))
     except ValueError:
         ewrite('Invalid report number: %s\n',
                number)
 
 
 class our_completer(object):
+    """Complete from a sorted index of the completions: the candidates for
+    a prefix are contiguous there, and found with a binary search"""
+
     def __init__(self, completions=None):
+        self.source = completions
         self.completions = None
         if completions:
-            self.completions = tuple(map(str, completions))
+            self.completions = tuple(sorted(set(map(str, completions))))
+        self.text = None
+        self.start = 0
 
     def complete(self, text, i):
         if not self.completions:
             return None
 
-        matching = [x for x in self.completions if x.startswith(text)]
-        if i < len(matching):
-            return matching[i]
+        # readline calls us with i = 0, 1, ... for the same text
+        if text != self.text:
+            self.text = text
+            self.start = bisect.bisect_left(self.completions, text)
+
+        pos = self.start + i
+        if pos < len(self.completions) and self.completions[pos].startswith(text):
+            return self.completions[pos]
         else:
             return None
 
 
+# the completer of the last prompt, reused if the same completions are
+# offered again (f.e. when asking again for a package name)
+_last_completer = None
+
+
+def get_completer(completions):
+    global _last_completer
+
+    if _last_completer is None or _last_completer.source is not completions:
+        _last_completer = our_completer(completions)
+    return _last_completer.complete
+
+
 def our_raw_input(prompt=None, completions=None, completer=None):
     istty = sys.stdout.isatty()
     if not istty:
@@ -144,7 +167,7 @@ def our_raw_input(prompt=None, completions=None, completer=None):
     sys.stderr.flush()
     if readline:
         if completions and not completer:
-            completer = our_completer(completions).complete
+            completer = get_completer(completions)
         if completer:
             readline.set_completer(completer)
 
@@ -437,6 +460,10 @@ def show_report(number, system, mirrors,
     try:
         info = debbugs.get_report(number, timeout, system, mirrors=mirrors,
                                   followups=1, http_proxy=http_proxy, archived=archived)
+        # only wait for the original report, the followups keep arriving
+        # in the background while it is read
+        if info and not info[1]:
+            info = None
     except:
         info = None
 
@@ -474,7 +501,7 @@ def show_report(number, system, mirrors,
 
         options = 'xOrbeq'
 
-        if (current_message + 1) < len(messages):
+        if messages.has(current_message + 1):
             options = 'N' + options.lower()
         if (current_message):
             options = 'p' + options
@@ -488,7 +515,7 @@ def show_report(number, system, mirrors,
                             'e': 'Launch e-mail client to read full log.',
                             'b': 'Launch web browser to read full log.',
                             'q': "I'm bored; quit please."},
-                           allow_numbers=list(range(1, len(messages) + 1)))
+                           allow_numbers=list(range(1, messages.fetched() + 1)))
         if x == 'x':
             return buginfo
         elif x == 'q':
@@ -499,8 +526,8 @@ def show_report(number, system, mirrors,
             skip_pager = True
         elif x == 'e':
             reportbug.utils.launch_mbox_reader(mbox_reader_cmd,
-                                               debbugs.get_report_url(system, number, mirrors, archived, True, True),
-                                               http_proxy, timeout)
+                                               debbugs.iter_bug_mbox(number, timeout, system, mirrors,
+                                                                     http_proxy, archived))
             skip_pager = True
         elif x == 'o':
             break
@@ -535,7 +562,8 @@ def handle_bts_query(package, bts, timeout, mirrors=None, http_proxy="",
 
     bugs = []
     try:
-        (count, title, hierarchy) = debbugs.get_reports(
+        (count, title, hierarchy) = prefetch.get_prefetcher().result(
+            debbugs.get_reports,
             package, timeout, bts, mirrors=mirrors, version=version,
             source=source, http_proxy=http_proxy, archived=archived)
     except Exception as e:
@@ -625,6 +653,8 @@ def browse_bugs(hierarchy, count, bugs, bts, queryonly, mirrors,
     lastpage = []
     digits = len(str(len(bugs)))
     linefmt = '  %' + str(digits) + 'd) %s\n'
+    # built once, the filters only narrow down its matches
+    index = hiermatch.HierarchyIndex(hierarchy)
     while category:
         scount += 1
         catname, reports = category[0:2]
@@ -730,7 +760,7 @@ def browse_bugs(hierarchy, count, bugs, bts, queryonly, mirrors,
                             raise NoReport
                     elif x == 'f':
                         # Do filter. Recursive done.
-                        retval = search_bugs(hierarchy, bts, queryonly, mirrors, http_proxy, timeout, screen, title,
+                        retval = search_bugs(index, bts, queryonly, mirrors, http_proxy, timeout, screen, title,
                                              package, mbox_reader_cmd)
                         if isinstance(retval, str) and retval in ["FilterEnd", "Top"]:
                             continue
@@ -739,8 +769,7 @@ def browse_bugs(hierarchy, count, bugs, bts, queryonly, mirrors,
                     elif x == 'e':
                         number = our_raw_input('Please enter the number of the bug you would like to view: #', allowed)
                         _launch_mbox_reader(mbox_reader_cmd, bts, bugs, number,
-                                            mirrors, 'no', True, True, http_proxy,
-                                            timeout)
+                                            mirrors, 'no', http_proxy, timeout)
                     else:
                         if x == 'm' or x == 'i':
                             if len(bugs) == 1:
@@ -786,30 +815,14 @@ def browse_bugs(hierarchy, count, bugs, bts, queryonly, mirrors,
             scount = scount + 1
 
 
-def proc_hierarchy(hierarchy):
-    """Find out bug count and bug # in the hierarchy."""
-
-    lenlist = [len(i[1]) for i in hierarchy]
-    if lenlist:
-        count = reduce(lambda x, y: x + y, lenlist)
-    else:
-        return 0, 0
-
-    # Copy & paste from handle_bts_query()
-    bugs = []
-    exp = re.compile(r'\#(\d+)[ :]')
-    for entry in hierarchy or []:
-        for bug in entry[1]:
-            match = exp.match(bug)
-            if match:
-                bugs.append(int(match.group(1)))
-    return count, bugs
-
+def search_bugs(index, bts, queryonly, mirrors,
+                http_proxy, timeout, screen, title, package, mbox_reader_cmd,
+                subhier=None):
+    """Search for the bug list using a pattern.
 
-def search_bugs(hierarchyfull, bts, queryonly, mirrors,
-                http_proxy, timeout, screen, title, package, mbox_reader_cmd):
-    """Search for the bug list using a pattern."""
-    """Return string "FilterEnd" when we are done with search."""
+    The search is done in a hiermatch.HierarchyIndex, among the matches
+    of the enclosing filter (subhier) if any.
+    Return string "FilterEnd" when we are done with search."""
 
     try:
         output_encoding = locale.getpreferredencoding()
@@ -824,13 +837,14 @@ def search_bugs(hierarchyfull, bts, queryonly, mirrors,
 
     # Create new hierarchy match the pattern.
     try:
-        hierarchy = hiermatch.matched_hierarchy(hierarchyfull, pattern)
+        subhier = index.search(pattern, subhier)
     except InvalidRegex:
         our_raw_input('Invalid regular expression, press ENTER to continue.')
         return "FilterEnd"
 
-    count, bugs = proc_hierarchy(hierarchy)
-    exp = re.compile(r'\#(\d+):')
+    hierarchy = index.hierarchy(subhier)
+    bugs = index.bugs(subhier)
+    count = sum(len(matches) for matches in subhier)
 
     if not count:
         our_raw_input('No match found, press ENTER to continue.')
@@ -948,8 +962,8 @@ def search_bugs(hierarchyfull, bts, queryonly, mirrors,
                             raise NoReport
                     elif x == 'f':
                         # Do filter. Recursive done.
-                        retval = search_bugs(hierarchy, bts, queryonly, mirrors, http_proxy, timeout, screen,
-                                             title, package, mbox_reader_cmd)
+                        retval = search_bugs(index, bts, queryonly, mirrors, http_proxy, timeout, screen,
+                                             title, package, mbox_reader_cmd, subhier)
                         if isinstance(retval, str) and retval in ["FilterEnd", "Top"]:
                             continue
                         else:
@@ -964,7 +978,7 @@ def search_bugs(hierarchyfull, bts, queryonly, mirrors,
                         number = our_raw_input('Please enter the number of the '
                                                'bug you would like to view: #', allowed)
                         _launch_mbox_reader(mbox_reader_cmd, bts, bugs, number,
-                                            mirrors, 'no', True, True, http_proxy, timeout)
+                                            mirrors, 'no', http_proxy, timeout)
                     else:
                         if x == 'm' or x == 'i':
                             number = our_raw_input(
@@ -527,12 +527,20 @@ def show_report(number, system, mirrors,
         return
 
     options = dict(o='Ok', d='More details (launch browser)',
-                   m='Submit more information', q='Quit')
-    valid = 'Odmq'
+                   m='Submit more information', q='Quit',
+                   n='Next message (followup)', p='Previous message (followup)')
 
+    (buginfo, bodies) = info
+    current = 0
     while 1:
-        (buginfo, bodies) = info
-        body = bodies[0]
+        # the followups are fetched in the background, while the
+        # first messages are shown
+        body = bodies[current]
+        valid = 'Odmq'
+        if bodies.has(current + 1):
+            valid += 'n'
+        if current:
+            valid += 'p'
 
         r = select_options(body, valid, title=buginfo.subject, ui=ui, help=options)
         ui = None
@@ -542,8 +550,12 @@ def show_report(number, system, mirrors,
             return -1
         elif r == 'm':
             return buginfo
-
-        launch_browser(debbugs.get_report_url(system, number, archived))
+        elif r == 'n':
+            current += 1
+        elif r == 'p':
+            current -= 1
+        else:
+            launch_browser(debbugs.get_report_url(system, number, archived))
     return
 
 
@@ -551,7 +563,7 @@ def handle_bts_query(package, bts, timeout, mirrors=None, http_proxy="",
                      queryonly=False, screen=None, title="", archived='no',
                      source=False, version=None, mbox=False, buglist=None,
                      mbox_reader_cmd=None, latest_first=False):
-    from reportbug import debbugs
+    from reportbug import debbugs, prefetch
 
     sysinfo = debbugs.SYSTEMS[bts]
     root = sysinfo.get('btsroot')
@@ -579,7 +591,8 @@ def handle_bts_query(package, bts, timeout, mirrors=None, http_proxy="",
 
     result = None
     try:
-        (count, sectitle, hierarchy) = debbugs.get_reports(
+        (count, sectitle, hierarchy) = prefetch.get_prefetcher().result(
+            debbugs.get_reports,
             package, timeout, bts, mirrors=mirrors, version=version,
             http_proxy=http_proxy, archived=archived, source=source)
     except Exception as e:
@@ -22,6 +22,9 @@
 #  SOFTWARE.
 
 import http.client
+import hashlib
+import json
+import time
 import urllib.request, urllib.parse, urllib.error
 import urllib.request, urllib.error, urllib.parse
 import getpass
@@ -29,9 +32,13 @@ import re
 import socket
 import shlex
 import os
+import tempfile
 import sys
+import threading
 import webbrowser
 import requests
+import requests.adapters
+import urllib3
 
 from .exceptions import (
     NoNetwork,
@@ -102,10 +109,283 @@ class handlepasswd(urllib.request.HTTPPasswordMgrWithDefaultRealm):
 
 _opener = None
 
+# connections kept open to each host; a few queries can run at once
+POOL_MAXSIZE = 10
+# transient failures (502/503/504 answers) are retried, but not failed
+# connections nor reads: an unreachable host would then keep the user waiting
+# several times the timeout asked for
+RETRIES = urllib3.util.Retry(total=3, connect=0, read=0, backoff_factor=0.5,
+                             status_forcelist=(502, 503, 504),
+                             raise_on_status=False)
+
+_connection_stats = {'requests': 0, 'opened': 0}
+_connection_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _connection_stats_lock:
+        _connection_stats[name] += 1
+
+
+class CountingHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    "count the requests sent, and the connections opened to send them"
+
+    def _new_conn(self):
+        _count('opened')
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        _count('requests')
+        return super().urlopen(*args, **kwargs)
+
+
+class CountingHTTPSConnectionPool(CountingHTTPConnectionPool,
+                                  urllib3.HTTPSConnectionPool):
+    pass
+
+
+class CountingHTTPAdapter(requests.adapters.HTTPAdapter):
+    "pooled keep-alive connections, counted in connection_stats()"
+
+    pool_classes_by_scheme = {'http': CountingHTTPConnectionPool,
+                              'https': CountingHTTPSConnectionPool}
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes_by_scheme
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self.pool_classes_by_scheme
+        return manager
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the requests session shared by all the queries of this run.
+
+    Its connections are kept alive and reused for the following requests
+    to the same host."""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': UA_STR,
+                'Accept-Encoding': 'gzip;q=1.0, deflate;q=0.9, identity;q=0.5'})
+            adapter = CountingHTTPAdapter(pool_maxsize=POOL_MAXSIZE,
+                                          max_retries=RETRIES)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def connection_stats():
+    """Return how many requests were sent, on how many connections.
+
+    A dict with the number of 'requests', of connections 'opened' and of
+    requests which 'reused' a connection opened before."""
+    with _connection_stats_lock:
+        stats = dict(_connection_stats)
+    stats['reused'] = max(0, stats['requests'] - stats['opened'])
+    return stats
+
+
+# how long a cached page is used without asking the server, in seconds
+HTTP_CACHE_TTL = 3600
+# the least recently used pages are evicted beyond this size, in bytes
+HTTP_CACHE_SIZE = 64 << 20
+
+
+class HttpCache(object):
+    """Pages fetched over HTTP, kept on disk with their validators.
+
+    A page younger than ttl is used as is; an older one is revalidated
+    with If-None-Match/If-Modified-Since, so that it is only downloaded
+    again if it changed.  Each page is a file named after its URL hash:
+    a line of JSON metadata followed by the body; its mtime is the last
+    use, and the least recently used pages go first when the cache grows
+    beyond maxsize.
+
+    The directory is only scanned on the first store, and when the size
+    of the pages, tracked from then on, goes over maxsize.  Pages sent
+    with Cache-Control: no-store or private aren't kept; no-cache ones
+    are revalidated each time."""
+
+    def __init__(self, directory=None, ttl=HTTP_CACHE_TTL, maxsize=HTTP_CACHE_SIZE):
+        if directory is None:
+            from . import utils
+            directory = os.path.join(utils.CACHEDIR, 'http')
+        self.directory = directory
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # total size of the pages, once the directory was scanned; pages
+        # are stored from several threads
+        self.size = None
+        self.lock = threading.Lock()
+
+    def filename(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+
+    def get(self, url):
+        """Return the (metadata, body) cached for url, or None"""
+        try:
+            with open(self.filename(url), 'rb') as fp:
+                meta = json.loads(fp.readline())
+                body = fp.read().decode('utf-8', 'surrogatepass')
+        except (IOError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return meta, body
+
+    def get_meta(self, url):
+        """Return the metadata cached for url, without reading the body,
+        or None"""
+        try:
+            with open(self.filename(url), 'rb') as fp:
+                meta = json.loads(fp.readline())
+        except (IOError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return meta
+
+    def is_fresh(self, meta):
+        if meta.get('revalidate'):
+            return False
+        return time.time() - meta.get('fetched', 0) < self.ttl
+
+    @staticmethod
+    def cache_control(headers):
+        """The set of the Cache-Control directives of a response"""
+        return {directive.split('=', 1)[0].strip().lower()
+                for directive in headers.get('Cache-Control', '').split(',')
+                if directive.strip()}
+
+    @staticmethod
+    def validators(meta):
+        """The headers making a request conditional on the cached page"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, body, etag=None, last_modified=None, revalidate=False):
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                'fetched': time.time()}
+        if revalidate:
+            meta['revalidate'] = True
+        data = json.dumps(meta).encode() + b'\n' + body.encode('utf-8', 'surrogatepass')
+        filename = self.filename(url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+        except (IOError, OSError):
+            return
+
+        with self.lock:
+            try:
+                oldsize = self._getsize(filename)
+                os.replace(tmpname, filename)
+            except OSError:
+                return
+            if self.size is None:
+                # the first store: find out how much the cache holds
+                self._evict()
+            else:
+                self.size += len(data) - oldsize
+                if self.size > self.maxsize:
+                    self._evict()
+
+    def refresh(self, url, meta, body, revalidate=False):
+        """The server said the cached page is still current"""
+        self.store(url, body, meta.get('etag'), meta.get('last_modified'), revalidate)
+
+    def remove(self, url):
+        filename = self.filename(url)
+        with self.lock:
+            size = self._getsize(filename)
+            try:
+                os.unlink(filename)
+            except OSError:
+                return
+            if self.size is not None:
+                self.size -= size
+
+    @staticmethod
+    def _getsize(filename):
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return 0
+
+    def touch(self, url):
+        try:
+            os.utime(self.filename(url))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used pages beyond maxsize, and
+        update the size of the cache, which other processes may have
+        changed too"""
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.maxsize:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+
+_http_cache = None
+
+
+def get_http_cache():
+    """Return the HttpCache used by urlopen"""
+    global _http_cache
+
+    if _http_cache is None:
+        _http_cache = HttpCache()
+    return _http_cache
+
 
 def urlopen(url, proxies=None, timeout=60, data=None):
     """Fetch an URL.
 
+    Successful answers are kept in the HTTP cache, see :class:`HttpCache`.
+
     :param url:
 
         The URL to open, e.g. ``"http://example.com/"``.
@@ -121,10 +401,33 @@ def urlopen(url, proxies=None, timeout=60, data=None):
     if not proxies:
         proxies = urllib.request.getproxies()
 
-    headers = {'User-Agent': UA_STR,
-               'Accept-Encoding': 'gzip;q=1.0, deflate;q=0.9, identity;q=0.5'}
-
-    return requests.get(url, headers=headers, proxies=proxies, timeout=timeout).text
+    cache = get_http_cache()
+    cached = cache.get(url)
+    headers = {}
+    if cached:
+        meta, body = cached
+        if cache.is_fresh(meta):
+            cache.touch(url)
+            return body
+        headers = cache.validators(meta)
+
+    response = get_session().get(url, headers=headers, proxies=proxies, timeout=timeout)
+    directives = cache.cache_control(response.headers)
+    keep = not directives & {'no-store', 'private'}
+    revalidate = 'no-cache' in directives
+    if response.status_code == 304 and cached:
+        if keep:
+            cache.refresh(url, meta, body, revalidate)
+        else:
+            cache.remove(url)
+        return body
+    if response.status_code == 200:
+        if keep:
+            cache.store(url, response.text, response.headers.get('ETag'),
+                        response.headers.get('Last-Modified'), revalidate)
+        else:
+            cache.remove(url)
+    return response.text
 
     # req = urllib.request.Request(url, data, headers)
     #
@@ -148,6 +451,14 @@ def urlopen(url, proxies=None, timeout=60, data=None):
     # return _opener.open(req, timeout=timeout)
 
 
+def _get_proxies(http_proxy=None):
+    proxies = urllib.request.getproxies()
+    if http_proxy:
+        proxies['http'] = http_proxy
+        proxies['https'] = http_proxy
+    return proxies
+
+
 # Global useful URL opener; returns None if the page is absent, otherwise
 # like urlopen
 def open_url(url, http_proxy=None, timeout=60):
@@ -171,16 +482,10 @@ def open_url(url, http_proxy=None, timeout=60):
 
     """
     # Set timeout to 60 secs (1 min), cfr bug #516449
-    # in #572316 we set a user-configurable timeout
-    socket.setdefaulttimeout(timeout)
-
-    proxies = urllib.request.getproxies()
-    if http_proxy:
-        proxies['http'] = http_proxy
-        proxies['https'] = http_proxy
-
+    # in #572316 we set a user-configurable timeout; it applies to this
+    # request only, the socket default timeout is left alone
     try:
-        page = urlopen(url, proxies, timeout)
+        page = urlopen(url, _get_proxies(http_proxy), timeout)
     except urllib.error.HTTPError as x:
         if x.code in (404, 500, 503):
             return None
@@ -203,6 +508,38 @@ def open_url(url, http_proxy=None, timeout=60):
     return page
 
 
+# Size of the pieces in which iter_url_lines() reads a page
+STREAM_CHUNK = 64 << 10
+
+
+def iter_url_lines(url, http_proxy=None, timeout=60, chunk_size=STREAM_CHUNK):
+    """Yield the lines of an URL, as bytes with their line end, while the
+    page is downloaded.
+
+    Unlike open_url(), the page is neither cached nor held in memory as a
+    whole.  Nothing is yielded if the page is absent; network errors raise
+    NoNetwork, even after some lines were yielded."""
+    try:
+        with get_session().get(url, proxies=_get_proxies(http_proxy),
+                               timeout=timeout, stream=True) as response:
+            if response.status_code in (404, 500, 503):
+                return
+            response.raise_for_status()
+
+            pending = b''
+            for chunk in response.iter_content(chunk_size):
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line + b'\n'
+            if pending:
+                yield pending
+    except requests.exceptions.RequestException as exc:
+        exc_name = exc.__class__.__name__
+        message = "Failed to open %(url)r (%(exc_name)s: %(exc)s)" % vars()
+        raise NoNetwork(message)
+
+
 def launch_browser(url):
     if not os.system('command -v xdg-open >/dev/null 2>&1'):
         cmd = 'xdg-open ' + shlex.quote(url)
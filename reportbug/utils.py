@@ -23,6 +23,13 @@
 import sys
 import os
 import re
+import io
+import sqlite3
+import threading
+import time
+import mmap
+import hashlib
+import concurrent.futures
 import platform
 
 try:
@@ -43,7 +50,6 @@ import apt
 import gzip
 import urllib
 
-from .urlutils import open_url
 from .mailer import MUA
 
 # Headers other than these become email headers for debbugs servers
@@ -101,7 +107,22 @@ CODENAME2SUITE = {'wheezy': 'oldoldoldoldstable',
                   'experimental': 'experimental'}
 SUITE2CODENAME = dict([(suite, codename) for codename, suite in list(CODENAME2SUITE.items())])
 
-_apt_cache = apt.Cache()
+# Where reportbug keeps the data it can rebuild (indexes, downloads, ...)
+CACHEDIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                        'reportbug')
+
+# opening the APT cache is expensive: only do it when it's actually needed
+_apt_cache = None
+
+
+def get_apt_cache():
+    """Return the (shared) apt.Cache instance, opening it on first use"""
+    global _apt_cache
+
+    if _apt_cache is None:
+        _apt_cache = apt.Cache()
+    return _apt_cache
+
 
 def realpath(filename):
     filename = os.path.abspath(filename)
@@ -188,7 +209,148 @@ def get_command_output(cmd):
     return subprocess.run(cmd, shell=use_shell, stdout=subprocess.PIPE).stdout.decode(errors='backslashreplace')
 
 
+# Location of the lists of the files installed by each package
+DPKG_INFO_DIR = '/var/lib/dpkg/info'
+
+# With merged /usr, these are aliases of the same directory in /usr
+MERGED_USR_DIRS = ('/bin', '/sbin', '/lib', '/lib32', '/lib64', '/libx32')
+
+
+class DpkgFileIndex(object):
+    """Persistent index of the files installed by the packages, built from
+    the dpkg *.list files.
+
+    It answers the same queries as 'dpkg --search' does (an exact path, or
+    a substring when the name isn't absolute) and it's kept up to date by
+    reindexing only the .list files that changed since last time."""
+
+    version = 1
+
+    def __init__(self, filename=None, infodir=DPKG_INFO_DIR):
+        self.infodir = infodir
+        if filename is None:
+            filename = os.path.join(CACHEDIR, 'dpkg-files.sqlite')
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.db = sqlite3.connect(filename, timeout=30)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS lists (package TEXT PRIMARY KEY, mtime INTEGER, size INTEGER);
+            CREATE TABLE IF NOT EXISTS files (path TEXT, package TEXT);
+            CREATE INDEX IF NOT EXISTS files_path ON files (path);
+            CREATE INDEX IF NOT EXISTS files_package ON files (package);
+        ''')
+        if self._meta('version') != self.version:
+            with self.db:
+                self.db.execute('DELETE FROM lists')
+                self.db.execute('DELETE FROM files')
+                self.db.execute('DELETE FROM meta')
+                self._set_meta('version', self.version)
+
+    def _meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def refresh(self):
+        """Reindex the .list files which changed since the last refresh"""
+        # dpkg replaces the .list files by renaming, so if the directory
+        # didn't change, none of them did
+        dirmtime = os.stat(self.infodir).st_mtime_ns
+        if self._meta('dirmtime') == dirmtime:
+            return
+
+        indexed = dict((package, (mtime, size)) for package, mtime, size in
+                       self.db.execute('SELECT package, mtime, size FROM lists'))
+        with self.db:
+            for entry in os.scandir(self.infodir):
+                if not entry.name.endswith('.list'):
+                    continue
+                package = entry.name[:-5]
+                st = entry.stat()
+                if indexed.pop(package, None) == (st.st_mtime_ns, st.st_size):
+                    continue
+                self._index_list(package, entry.path, st)
+
+            # those left have been removed
+            for package in indexed:
+                self.db.execute('DELETE FROM files WHERE package = ?', (package,))
+                self.db.execute('DELETE FROM lists WHERE package = ?', (package,))
+            self._set_meta('dirmtime', dirmtime)
+
+    def _index_list(self, package, filename, st):
+        try:
+            with open(filename, errors='backslashreplace') as fp:
+                paths = [line.rstrip('\n') for line in fp]
+        except IOError:
+            paths = []
+        self.db.execute('DELETE FROM files WHERE package = ?', (package,))
+        self.db.executemany('INSERT INTO files VALUES (?, ?)',
+                            ((path, package) for path in paths if path and path != '/.'))
+        self.db.execute('INSERT OR REPLACE INTO lists VALUES (?, ?, ?)',
+                        (package, st.st_mtime_ns, st.st_size))
+
+    def _collect(self, rows):
+        packages = {}
+        for path, package in rows:
+            packages.setdefault(package, []).append(path)
+        return packages
+
+    def search(self, filename):
+        """Return a dict of package -> matching paths, as query_dpkg_for()"""
+        if not filename.startswith('/'):
+            return self._collect(self.db.execute(
+                'SELECT path, package FROM files WHERE instr(path, ?) > 0', (filename,)))
+
+        path = filename.rstrip('/') or '/'
+        return self._collect(self.db.execute(
+            'SELECT path, package FROM files WHERE path = ?', (path,)))
+
+    def aliases(self, filename):
+        """The other names of filename with merged /usr"""
+        for directory in MERGED_USR_DIRS:
+            if filename == '/usr' + directory or filename.startswith('/usr' + directory + '/'):
+                return [filename[4:]]
+            if filename == directory or filename.startswith(directory + '/'):
+                return ['/usr' + filename]
+        return []
+
+
+_dpkg_file_index = None
+
+
+def get_dpkg_file_index():
+    """Return the (shared, up to date) DpkgFileIndex, or None if it cannot
+    be built"""
+    global _dpkg_file_index
+
+    try:
+        if _dpkg_file_index is None:
+            try:
+                _dpkg_file_index = DpkgFileIndex()
+            except (OSError, sqlite3.Error):
+                # no usable cache directory: keep the index in memory
+                _dpkg_file_index = DpkgFileIndex(':memory:')
+        _dpkg_file_index.refresh()
+    except (OSError, sqlite3.Error):
+        _dpkg_file_index = None
+    return _dpkg_file_index
+
+
 def query_dpkg_for(filename, use_dlocate=True):
+    index = get_dpkg_file_index()
+    if index is not None:
+        packages = index.search(filename)
+        if not packages and filename.startswith('/'):
+            # dpkg and merged /usr do not work well together
+            for alias in index.aliases(filename):
+                packages = index.search(alias)
+                if packages:
+                    return alias, packages
+        return filename, packages
+
     try:
         x = os.getcwd()
     except OSError:
@@ -340,38 +502,148 @@ def get_user_id(emailaddr='', realname='', charset='utf-8'):
 
 statuscache = {}
 
+# Location of the dpkg status database
+DPKG_STATUS_FILE = '/var/lib/dpkg/status'
+
+# Field matchers used to parse a package status stanza
+versionre = re.compile('Version: ')
+packagere = re.compile('Package: ')
+priorityre = re.compile('Priority: ')
+dependsre = re.compile('(Pre-)?Depends: ')
+recsre = re.compile('Recommends: ')
+suggestsre = re.compile('Suggests: ')
+conffilesre = re.compile('Conffiles:')
+maintre = re.compile('Maintainer: ')
+statusre = re.compile('Status: ')
+originre = re.compile('Origin: ')
+bugsre = re.compile('Bugs: ')
+descre = re.compile('Description(?:-[a-zA-Z]+)?: ')
+srcre = re.compile('Source: ')
+sectionre = re.compile('Section: ')
+
+
+class DpkgStatusDB(object):
+    """Memory-mapped view of the dpkg status file, indexed by package name.
+
+    The index maps each package name to the (start, end) byte offsets of
+    its stanzas, so a lookup only decodes the stanza it needs instead of
+    asking dpkg to re-read the whole database."""
+
+    packagere = re.compile(rb'^Package: ([^\s]+)$', re.MULTILINE)
+    archre = re.compile(rb'^Architecture: ([^\s]+)$', re.MULTILINE)
+    statusre = re.compile(rb'^Status: (.*)$', re.MULTILINE)
+    versionre = re.compile(rb'^Version: (.*)$', re.MULTILINE)
+    sourcere = re.compile(rb'^Source: (.*)$', re.MULTILINE)
+
+    def __init__(self, filename=DPKG_STATUS_FILE):
+        self.filename = filename
+        self.index = {}
+        # PackageInfoIndex built on top of this database, see
+        # get_package_info_index()
+        self.info_index = None
+        with open(filename, 'rb') as fp:
+            self.signature = self._signature(os.fstat(fp.fileno()))
+            if self.signature[1]:
+                self.data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = b''
+        self._build_index()
+
+    @staticmethod
+    def _signature(st):
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def is_current(self):
+        """Check whether the status file on disk is still the indexed one"""
+        try:
+            return self._signature(os.stat(self.filename)) == self.signature
+        except OSError:
+            return False
+
+    def _build_index(self):
+        data = self.data
+        for m in self.packagere.finditer(data):
+            # the Package field is normally the first one of a stanza, but
+            # do not rely on it
+            start = data.rfind(b'\n\n', 0, m.start())
+            start = 0 if start < 0 else start + 2
+            end = data.find(b'\n\n', m.end())
+            if end < 0:
+                end = len(data)
+            self.index.setdefault(m.group(1).decode(), []).append((start, end))
+
+    def packages(self):
+        """Return the names of all the packages known to dpkg"""
+        return list(self.index.keys())
+
+    def installed(self):
+        """Return the (package, version, source package) of the installed
+        packages, sorted by name"""
+        packages = {}
+        for name, offsets in self.index.items():
+            for (start, end) in offsets:
+                status = self._field(self.statusre, start, end)
+                if not status or status.split()[-1] != 'installed':
+                    continue
+                version = self._field(self.versionre, start, end)
+                source = self._field(self.sourcere, start, end)
+                source = source.split()[0] if source else name
+                packages[name] = (name, version, source)
+                break
+        return [packages[name] for name in sorted(packages)]
+
+    def paragraphs(self):
+        """Iterate over all the stanzas, as strings, in file order"""
+        for (start, end) in sorted(o for l in self.index.values() for o in l):
+            yield self.data[start:end].decode(errors='backslashreplace')
+
+    def _field(self, regex, start, end):
+        m = regex.search(self.data, start, end)
+        if m:
+            return m.group(1).decode(errors='backslashreplace')
+        return None
+
+    def lookup(self, package):
+        """Return the status stanza of package, as dpkg --status would.
+
+        Multi-Arch: same packages may have a stanza per architecture; an
+        arch-qualified name (e.g. "libc6:amd64") selects one of them,
+        otherwise the first one not purged from the system is used."""
+
+        name, sep, arch = package.partition(':')
+        for (start, end) in self.index.get(name, []):
+            if sep and self._field(self.archre, start, end) != arch:
+                continue
+            status = self._field(self.statusre, start, end)
+            if status and status.split()[-1] == 'not-installed':
+                continue
+            return self.data[start:end].decode(errors='backslashreplace')
+        return None
+
+
+_dpkg_status_db = None
+
+
+def get_dpkg_status_db():
+    """Return the (shared) DpkgStatusDB instance, or None if the dpkg status
+    file cannot be read.
+
+    The database is re-read only if dpkg changed the status file since it
+    was last indexed."""
+    global _dpkg_status_db
+
+    if _dpkg_status_db is None or not _dpkg_status_db.is_current():
+        try:
+            _dpkg_status_db = DpkgStatusDB()
+        except (OSError, ValueError):
+            _dpkg_status_db = None
+    return _dpkg_status_db
+
 
 def get_package_status(package, avail=False):
     if not avail and package in statuscache:
         return statuscache[package]
 
-    versionre = re.compile('Version: ')
-    packagere = re.compile('Package: ')
-    priorityre = re.compile('Priority: ')
-    dependsre = re.compile('(Pre-)?Depends: ')
-    recsre = re.compile('Recommends: ')
-    suggestsre = re.compile('Suggests: ')
-    conffilesre = re.compile('Conffiles:')
-    maintre = re.compile('Maintainer: ')
-    statusre = re.compile('Status: ')
-    originre = re.compile('Origin: ')
-    bugsre = re.compile('Bugs: ')
-    descre = re.compile('Description(?:-[a-zA-Z]+)?: ')
-    fullre = re.compile(' ')
-    srcre = re.compile('Source: ')
-    sectionre = re.compile('Section: ')
-
-    pkgversion = pkgavail = maintainer = status = origin = None
-    bugs = vendor = priority = desc = src_name = section = None
-    conffiles = []
-    fulldesc = []
-    depends = []
-    recommends = []
-    suggests = []
-    confmode = False
-    descmode = False
-    state = ''
-
     try:
         x = os.getcwd()
     except OSError:
@@ -381,6 +653,8 @@ def get_package_status(package, avail=False):
     if avail:
         output = get_command_output(
             "LC_ALL=C.UTF-8 apt-cache show %s 2>/dev/null" % packarg)
+    elif get_dpkg_status_db() is not None:
+        output = get_dpkg_status_db().lookup(package) or ''
     else:
         # filter through dpkg-query to automatically append arch
         # qualifier in the cases where this is needed
@@ -392,6 +666,28 @@ def get_package_status(package, avail=False):
         output = get_command_output(
             "COLUMNS=79 dpkg --status %s 2>/dev/null" % packarg)
 
+    info = parse_package_status(output)
+
+    if not avail:
+        statuscache[package] = info
+    return info
+
+
+def parse_package_status(output):
+    """Parse a package stanza (from dpkg --status or apt-cache show) into
+    the tuple returned by get_package_status()."""
+
+    pkgversion = pkgavail = maintainer = status = origin = None
+    bugs = vendor = priority = desc = src_name = section = None
+    conffiles = []
+    fulldesc = []
+    depends = []
+    recommends = []
+    suggests = []
+    confmode = False
+    descmode = False
+    state = ''
+
     for line in output.split(os.linesep):
         line = line.rstrip()
         if not line:
@@ -477,8 +773,6 @@ def get_package_status(package, avail=False):
             desc, src_name, os.linesep.join(fulldesc), state, tuple(suggests),
             section)
 
-    if not avail:
-        statuscache[package] = info
     return info
 
 
@@ -487,36 +781,79 @@ def get_package_status(package, avail=False):
 
 # Object that essentially chunkifies the output of apt-cache dumpavail
 class AvailDB(object):
+    """Iterate over the paragraphs of a Debian control-like stream.
+
+    The stream is read in large blocks and split on blank lines; raw()
+    hands out each paragraph as a memoryview on the read buffer, while
+    iterating over the object decodes them to strings, one at a time."""
+
+    blocksize = 1 << 20
+
     def __init__(self, fp=None, popenob=None):
         self.popenob = popenob
+        self.fp = None
         if fp:
             self.fp = fp
         elif popenob:
             self.fp = popenob.stdout
+        self.buffer = b''
+        self.pos = 0
+        self.eof = False
 
     def __iter__(self):
         return self
 
-    def __next__(self):
-        chunk = ''
+    def _fill(self):
+        if self.popenob and self.popenob.returncode:
+            self.eof = True
+            return
+
+        block = self.fp.read(self.blocksize)
+        if not block:
+            self.eof = True
+            return
+        if isinstance(block, str):
+            block = block.encode(errors='surrogateescape')
+        # only the (partial) paragraph left over is copied
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+
+    def next_raw(self):
+        """Return the next paragraph, as a memoryview"""
         while True:
-            if self.popenob:
-                if self.popenob.returncode:
-                    break
+            if self.buffer[self.pos:self.pos + 1] == b'\n':
+                # an empty line on its own
+                self.pos += 1
+                return memoryview(b'')
+
+            end = self.buffer.find(b'\n\n', self.pos)
+            if end >= 0:
+                chunk = memoryview(self.buffer)[self.pos:end + 1]
+                self.pos = end + 2
+                return chunk
 
-            line = self.fp.readline()
-            if not line:
+            if self.eof:
                 break
+            self._fill()
 
-            if line == '\n':
-                return chunk
-            chunk += str(line)
-
-        if chunk:
+        if self.pos < len(self.buffer):
+            chunk = memoryview(self.buffer)[self.pos:]
+            self.pos = len(self.buffer)
             return chunk
 
         raise StopIteration
 
+    def raw(self):
+        """Iterate over the paragraphs, as memoryviews"""
+        while True:
+            try:
+                yield self.next_raw()
+            except StopIteration:
+                return
+
+    def __next__(self):
+        return str(self.next_raw(), errors='backslashreplace')
+
     def __del__(self):
         # print >> sys.stderr, 'availdb cleanup', repr(self.popenob), repr(self.fp)
         if self.popenob:
@@ -533,7 +870,7 @@ class AvailDB(object):
 
 
 def get_dpkg_database():
-    subp = subprocess.Popen(('dpkg-query', '--status'), errors="backslashreplace", stdout=subprocess.PIPE)
+    subp = subprocess.Popen(('dpkg-query', '--status'), stdout=subprocess.PIPE)
     return AvailDB(popenob=subp)
 
 
@@ -545,7 +882,7 @@ def get_avail_database():
 
 def get_source_name(package):
     try:
-        return _apt_cache[package].versions[0].source_name
+        return get_apt_cache()[package].versions[0].source_name
     except KeyError:
         pass
     # check if there is a source package with that name
@@ -587,9 +924,10 @@ def get_source_package(package, only_source=False):
 
         found.add(srcrecords.package)
 
+        cache = get_apt_cache()
         for bp in sorted(srcrecords.binaries):
             try:
-                desc = _apt_cache[bp].versions[0].summary
+                desc = cache[bp].versions[0].summary
             except KeyError:
                 continue
             if desc:
@@ -600,70 +938,119 @@ def get_source_package(package, only_source=False):
     return packages
 
 
-def get_package_info(packages, skip_notfound=False):
+class PackageInfoIndex(object):
+    """Summary of the installed packages, indexed by name and by the
+    virtual packages they provide.
+
+    Each entry is a (package, status, version, description, provides)
+    tuple, where status is the two-letter abbreviation shown by dpkg -l
+    and provides is the list of the names in the Provides field."""
+
+    def __init__(self, paragraphs):
+        self.entries = []
+        self.by_name = {}
+        self.by_provides = {}
+        for p in paragraphs:
+            self.add(p)
+
+    def add(self, paragraph):
+        fields = {}
+        for line in paragraph.split('\n'):
+            if not line or line[0] in ' \t':
+                continue
+            (field, sep, value) = line.partition(':')
+            if field.startswith('Description-'):
+                field = 'Description'
+            if sep and field not in fields:
+                fields[field] = value[1:] if value.startswith(' ') else value
+
+        pack = fields.get('Package')
+        sinfo = fields.get('Status', '').split()
+        if not pack or len(sinfo) < 3:
+            return
+        stat = sinfo[0][0] + sinfo[2][0]
+        # check if the package is installed, and in that case, retrieve
+        # its information; if the first char is not 'i' or 'h' (install
+        # or hold) or the second is 'n' (not-installed), then skip data
+        # retrieval
+        if stat[0] not in 'ih' or stat[1] == 'n':
+            return
+
+        provides = []
+        if fields.get('Provides'):
+            provides = [x.split()[0] for x in fields['Provides'].split(',') if x.strip()]
+
+        pos = len(self.entries)
+        self.entries.append((pack, stat, fields.get('Version'),
+                             fields.get('Description'), provides))
+        self.by_name.setdefault(pack, []).append(pos)
+        for name in provides:
+            self.by_provides.setdefault(name, []).append(pos)
+
+    def search(self, packages):
+        """Return the (package, status, version, description, provides)
+        tuples of the installed packages named or provided by packages,
+        in database order; provides is the matching virtual package, or
+        None if the package was matched by name."""
+
+        packages = set(packages)
+        hits = set()
+        for name in packages:
+            hits.update((pos, False) for pos in self.by_name.get(name, []))
+            hits.update((pos, True) for pos in self.by_provides.get(name, []))
+
+        ret = []
+        for (pos, isprovides) in sorted(hits):
+            (pack, stat, vers, desc, provides) = self.entries[pos]
+            if isprovides:
+                # report the last matching name, as the Provides regex used
+                # to do
+                provides = [x for x in provides if x in packages][-1]
+            else:
+                provides = None
+            ret.append((pack, stat, vers, desc, provides))
+        return ret
+
+
+def get_package_info_index():
+    """Return the PackageInfoIndex for the installed packages.
+
+    The index is kept with the dpkg status database, so it's rebuilt only
+    when the database changes; if the status file can't be read, it's
+    built from the output of dpkg-query."""
+
+    db = get_dpkg_status_db()
+    if db is None:
+        return PackageInfoIndex(get_dpkg_database())
+    if db.info_index is None:
+        db.info_index = PackageInfoIndex(db.paragraphs())
+    return db.info_index
+
+
+def get_package_info(packages, skip_notfound=False, index=None):
     if not packages:
         return []
 
-    packinfo = get_dpkg_database()
-    pkgname = r'(?:[\S]+(?:\s+\(=[^()]+\))?(?:$|,\s+))'
+    if index is None:
+        index = get_package_info_index()
 
     groupfor = {}
-    searchpkgs = []
-    searchbits = []
     for (group, package) in packages:
         groupfor[package] = group
-        escpkg = re.escape(package)
-        searchpkgs.append(escpkg + r'(?:\s+\(=[^()]+\))?')
-
-    searchbits = [
-        # Package regular expression
-        r'^(?P<hdr>Package):\s+(' + '|'.join(searchpkgs) + ')$',
-        # Provides regular expression
-        r'^(?P<hdr>Provides):\s+' + pkgname + r'*(?P<pkg>' + '|'.join(searchpkgs) +
-        r')(?:$|,\s+)' + pkgname + '*$'
-    ]
 
     groups = list(groupfor.values())
     found = {}
 
-    searchobs = [re.compile(x, re.MULTILINE) for x in searchbits]
-    packob = re.compile('^Package: (?P<pkg>.*)$', re.MULTILINE)
-    statob = re.compile('^Status: (?P<stat>.*)$', re.MULTILINE)
-    versob = re.compile('^Version: (?P<vers>.*)$', re.MULTILINE)
-    descob = re.compile('^Description(?:-[a-zA-Z]+)?: (?P<desc>.*)$', re.MULTILINE)
-
     ret = []
-    for p in packinfo:
-        for ob in searchobs:
-            m = ob.search(p)
-            if m:
-                pack = packob.search(p).group('pkg')
-                stat = statob.search(p).group('stat')
-                sinfo = stat.split()
-                stat = sinfo[0][0] + sinfo[2][0]
-                # check if the package is installed, and in that case, retrieve
-                # its information; if the first char is not 'i' or 'h' (install
-                # or hold) or the second is 'n' (not-installed), then skip data
-                # retrieval
-                if stat[0] not in 'ih' or stat[1] == 'n':
-                    continue
-
-                if m.group('hdr') == 'Provides':
-                    provides = m.group('pkg').split()[0]
-                else:
-                    provides = None
-
-                vers = versob.search(p).group('vers')
-                desc = descob.search(p).group('desc')
-
-                info = (pack, stat, vers, desc, provides)
-                ret.append(info)
-                group = groupfor.get(pack)
-                if group:
-                    for item in group:
-                        found[item] = True
-                if provides not in found:
-                    found[provides] = True
+    for info in index.search(groupfor):
+        (pack, stat, vers, desc, provides) = info
+        ret.append(info)
+        group = groupfor.get(pack)
+        if group:
+            for item in group:
+                found[item] = True
+        if provides not in found:
+            found[provides] = True
 
     if skip_notfound:
         return ret
@@ -687,7 +1074,27 @@ def packages_providing(package):
     return ret
 
 
-def get_dependency_info(package, depends, rel="depends on"):
+_package_names = None
+
+
+def get_package_names():
+    """Return the sorted names of the packages APT knows about, as
+    'apt-cache pkgnames' does.
+
+    If the APT cache is open already, the names come from there instead
+    of running apt-cache again."""
+    global _package_names
+
+    if _package_names is None:
+        if _apt_cache is not None:
+            names = set(name.split(':')[0] for name in _apt_cache.keys())
+        else:
+            names = set(subprocess.getoutput('apt-cache pkgnames 2>/dev/null').split())
+        _package_names = tuple(sorted(names))
+    return _package_names
+
+
+def get_dependency_info(package, depends, rel="depends on", index=None):
     if not depends:
         return ('\n%s %s no packages.\n' % (package, rel))
 
@@ -701,7 +1108,7 @@ def get_dependency_info(package, depends, rel="depends on"):
     depinfo = "\nVersions of packages %s %s:\n" % (package, rel)
 
     packs = {}
-    for info in get_package_info(dependencies):
+    for info in get_package_info(dependencies, index=index):
         pkg = info[0]
         if pkg not in packs:
             packs[pkg] = info
@@ -741,34 +1148,83 @@ def get_dependency_info(package, depends, rel="depends on"):
     return depinfo
 
 
-def get_changed_config_files(conffiles, nocompress=False):
-    confinfo = {}
-    changed = []
-    for (filename, md5sum) in conffiles:
-        try:
-            fp = open(filename, errors='backslashreplace')
-        except IOError as msg:
-            confinfo[filename] = msg
+def get_dependencies_info(relations):
+    """Batch version of get_dependency_info().
+
+    relations is a list of (package, depends, rel) tuples; the formatted
+    sections are returned in the same order, all of them resolved with a
+    single pass over the dpkg database."""
+
+    index = None
+    if any(depends for (package, depends, rel) in relations):
+        index = get_package_info_index()
+
+    return [get_dependency_info(package, depends, rel, index)
+            for (package, depends, rel) in relations]
+
+
+# how many files are hashed at the same time
+HASH_JOBS = min(8, os.cpu_count() or 1)
+
+
+def file_digest(filename, algorithm='md5', keep=False):
+    """Hash a file, reading it in blocks.
+
+    Returns the hex digest and, if keep is True, the content of the file
+    (else None), so it doesn't have to be read again. The hashing releases
+    the GIL, so this can be run in parallel threads."""
+    digest = hashlib.new(algorithm)
+    blocks = []
+    with open(filename, 'rb') as fp:
+        while True:
+            block = fp.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+            if keep:
+                blocks.append(block)
+
+    return digest.hexdigest(), b''.join(blocks) if keep else None
+
+
+def _check_conffile(conffile, nocompress):
+    filename, md5sum = conffile
+    try:
+        filemd5, content = file_digest(filename, keep=True)
+    except IOError as msg:
+        return msg, False
+
+    if filemd5 == md5sum:
+        return None, False
+
+    thisinfo = 'changed:\n'
+    for line in io.TextIOWrapper(io.BytesIO(content), errors='backslashreplace'):
+        if not line:
             continue
 
-        filemd5 = get_command_output('md5sum ' + shlex.quote(filename)).split()[0]
-        if filemd5 == md5sum:
+        if line == '\n' and not nocompress:
+            continue
+        if line[0] == '#' and not nocompress:
             continue
 
-        changed.append(filename)
-        thisinfo = 'changed:\n'
-        for line in fp:
-            if not line:
-                continue
+        thisinfo += line
 
-            if line == '\n' and not nocompress:
-                continue
-            if line[0] == '#' and not nocompress:
-                continue
+    return thisinfo, True
 
-            thisinfo += line
 
-        confinfo[filename] = thisinfo
+def get_changed_config_files(conffiles, nocompress=False, jobs=None):
+    confinfo = {}
+    changed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or HASH_JOBS) as executor:
+        results = executor.map(_check_conffile, conffiles,
+                               [nocompress] * len(conffiles))
+        # map() keeps the order of the conffiles
+        for (filename, md5sum), (info, is_changed) in zip(conffiles, results):
+            if info is None:
+                continue
+            if is_changed:
+                changed.append(filename)
+            confinfo[filename] = info
 
     return confinfo, changed
 
@@ -891,7 +1347,7 @@ CONFIG_ARGS = (
     'headers', 'interface', 'template', 'mode', 'check_available', 'query_src',
     'printonly', 'offline', 'check_uid', 'smtptls', 'smtpuser', 'smtppasswd',
     'paranoid', 'mbox_reader_cmd', 'max_attachment_size', 'listccme',
-    'outfile', 'draftpath')
+    'outfile', 'draftpath', 'http_cache_ttl', 'verify_jobs')
 
 
 def first_run():
@@ -985,6 +1441,12 @@ def parse_config_files():
                 elif token == 'max_attachment_size':
                     arg = lex.get_token()
                     args['max_attachment_size'] = int(arg)
+                elif token == 'http_cache_ttl':
+                    arg = lex.get_token()
+                    args['http_cache_ttl'] = int(arg)
+                elif token == 'verify_jobs':
+                    arg = lex.get_token()
+                    args['verify_jobs'] = int(arg)
                 elif token == 'envelopefrom':
                     token = lex.get_token().lower()
                     args['envelopefrom'] = token
@@ -1121,18 +1583,22 @@ def cleanup_msg(dmessage, headers, pseudos, btstype):
     return message, newheaders, clean_pseudoheaders
 
 
-def launch_mbox_reader(cmd, url, http_proxy, timeout):
-    """Runs the command specified by cmd passing the mbox file
-    downloaded from url as a parameter. If cmd is None or fails, then
-    fallback to mail program."""
-    mbox = open_url(url, http_proxy, timeout)
-    if mbox is None:
-        return
-    (fd, fname) = TempFile()
+def launch_mbox_reader(cmd, mbox):
+    """Runs the command specified by cmd passing a file with the mbox
+    as a parameter. If cmd is None or fails, then fallback to mail
+    program.
+
+    mbox is an iterable of bytes, e.g. debbugs.iter_bug_mbox(), written
+    to the file as it comes: nothing is launched if it is empty."""
+    (fd, fname) = TempFile(text=False, mode='wb')
     try:
-        for line in mbox.splitlines():
-            fd.write(line + '\n')
-        fd.close()
+        with fd:
+            empty = True
+            for chunk in mbox:
+                fd.write(chunk)
+                empty = False
+        if empty:
+            return
         if cmd is not None:
             try:
                 cmd = cmd % fname
@@ -1308,6 +1774,87 @@ def get_kernel_taint_flags():
     return flags
 
 
+# The facts about the system reported in the System Information section:
+# name -> (probe, value if the probe fails or times out, timeout in seconds)
+SYSTEM_PROBES = {
+    'shellpath': (lambda: realpath('/bin/sh'), '/bin/sh', 5),
+    'init': (lambda: get_init_system(), 'unable to detect', 5),
+    'lsminfo': (lambda: get_lsm_info(), None, 5),
+    'taint_flags': (lambda: get_kernel_taint_flags(), [], 5),
+    'charmap': (lambda: subprocess.getoutput('locale charmap'), '', 5),
+    'arch': (lambda: get_arch(), None, 5),
+    'multiarch': (lambda: get_multiarch(), '', 5),
+    'debian_release': (lambda: get_debian_release_info(), '', 30),
+    'lsb_release': (lambda: lsb_release_info(), '', 10),
+}
+# the probes read by the System Information section itself, whatever the
+# infofunc of the BTS
+REPORT_PROBES = ('shellpath', 'init', 'lsminfo', 'taint_flags', 'charmap')
+
+
+class SystemFacts(object):
+    """Collect the facts about the system that go in a report.
+
+    All the probes are started at once, each in its own thread, so that
+    collecting them takes as long as the slowest one; a probe which fails,
+    or doesn't answer within its timeout, gets its default value, which
+    stays its value even if the probe finishes later."""
+
+    def __init__(self, names=None, probes=None):
+        self.probes = probes or SYSTEM_PROBES
+        self.results = {}
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.started = {}
+        for name in (names or self.probes):
+            self.start(name)
+
+    def start(self, name):
+        if name in self.threads:
+            return
+        probe = self.probes[name][0]
+
+        def run():
+            try:
+                result = probe()
+            except Exception:
+                return
+            with self.lock:
+                self.results.setdefault(name, result)
+
+        # daemon threads: a stuck probe must not block reportbug exiting
+        thread = threading.Thread(target=run, name='probe-' + name, daemon=True)
+        self.threads[name] = thread
+        self.started[name] = time.monotonic()
+        thread.start()
+
+    def get(self, name):
+        """Return the result of a probe, waiting for it if needed"""
+        self.start(name)
+        default, timeout = self.probes[name][1:]
+        thread = self.threads[name]
+        thread.join(max(0, self.started[name] + timeout - time.monotonic()))
+        with self.lock:
+            # a late result must not change what the report already got
+            return self.results.setdefault(name, default)
+
+
+_system_facts = None
+
+
+def get_system_facts(names=None):
+    """Return the SystemFacts of this run, starting the probes of names
+    (all of them by default) if needed"""
+    global _system_facts
+
+    if _system_facts is None:
+        _system_facts = SystemFacts(names)
+    else:
+        for name in (_system_facts.probes if names is None else names):
+            _system_facts.start(name)
+    return _system_facts
+
+
 def is_security_update(pkgname, pkgversion):
     """Determine whether a given package is a security update.
 
@@ -1349,7 +1896,7 @@ def is_security_update(pkgname, pkgversion):
     # them are distributed through the normal channels as part of a
     # stable release update.
     try:
-        p = _apt_cache[pkgname]
+        p = get_apt_cache()[pkgname]
         if 'Debian-Security' in [o.label for o in
                         p.versions[pkgversion].origins]:
             return True
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 import pytest
 
@@ -54,3 +55,32 @@ class TestBugreport(unittest.TestCase):
         with self.assertRaises(TypeError):
             self.report = bugreport(package=self.package, body=self.body,
                                     followup={'123456': 654321})
+
+    def test_sections_rendered_once(self):
+        report = bugreport(package='reportbug', body='test', depinfo='deps\n')
+        with mock.patch.object(report, 'render_sysinfo', wraps=report.render_sysinfo) as sysinfo, \
+                mock.patch.object(report, 'render_body', wraps=report.render_body) as body:
+            text = str(report)
+            self.assertEqual(str(report), text)
+            self.assertEqual(sysinfo.call_count, 1)
+            self.assertEqual(body.call_count, 1)
+
+            # only the sections depending on what changed are rendered again
+            report.body = 'other test'
+            text = str(report)
+            self.assertIn('other test', text)
+            self.assertEqual(sysinfo.call_count, 1)
+            self.assertEqual(body.call_count, 2)
+
+            report.depinfo = 'other deps\n'
+            self.assertIn('other deps', str(report))
+            self.assertEqual(body.call_count, 2)
+
+        del report.depinfo
+        self.assertNotIn('deps', str(report))
+
+        report.sysinfo = False
+        self.assertNotIn('-- System Information:', str(report))
+        self.assertEqual(report.section('sysinfo'), '')
+        report.sysinfo = True
+        self.assertIn('-- System Information:', str(report))
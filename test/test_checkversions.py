@@ -1,9 +1,12 @@
+import os
+import tempfile
+import threading
 import unittest
 from unittest import mock
 
 import pytest
 
-from reportbug import checkversions
+from reportbug import checkversions, prefetch, urlutils, utils
 
 
 class TestCheckversions(unittest.TestCase):
@@ -34,6 +37,80 @@ class TestCheckversions(unittest.TestCase):
         self.assertEqual(checkversions.later_version('1.2.4', '1.2.3'), '1.2.4')
 
 
+class TestCheckAvailable(unittest.TestCase):
+    def test_check_available(self):
+        # the queries only return once all of them are running
+        barrier = threading.Barrier(3, timeout=10)
+
+        def answer(value):
+            def query(*args):
+                barrier.wait()
+                return value
+            return query
+
+        __save = (checkversions.get_incoming_version,
+                  checkversions.get_versions_available,
+                  checkversions.get_newqueue_available,
+                  utils.get_source_name, prefetch._prefetcher)
+        checkversions.get_incoming_version = answer('1.2-1')
+        checkversions.get_versions_available = answer({'unstable': '1.1-1', 'stable': '1.0-1'})
+        checkversions.get_newqueue_available = answer({'experimental (new)': '2.0-1'})
+        utils.get_source_name = mock.MagicMock(return_value='foo-src')
+        prefetch._prefetcher = prefetch.Prefetcher()
+
+        avail, toonew = checkversions.check_available('foo', '1.1-1', 60)
+        self.assertEqual(avail, {'incoming': '1.2-1', 'experimental (new)': '2.0-1'})
+        self.assertFalse(toonew)
+        utils.get_source_name.assert_called_once_with('foo')
+        self.assertEqual(prefetch._prefetcher.futures, {})
+
+        (checkversions.get_incoming_version,
+         checkversions.get_versions_available,
+         checkversions.get_newqueue_available,
+         utils.get_source_name, prefetch._prefetcher) = __save
+
+
+class TestCheckAvailableMany(unittest.TestCase):
+    def test_check_available_many(self):
+        madison = {'a': {'unstable': '2.0-1'}, 'b': {'unstable': '1.0-1'},
+                   'c': {'unstable': '0.9-1'}, 'd': {}, 'e': {'unstable': '5.0-1'}}
+
+        def query_madison(packages, dists, timeout, http_proxy=None):
+            return dict((p, madison[p]) for p in packages)
+
+        newqueue = checkversions.NewQueueIndex(':memory:')
+        newqueue.sources = {'e-src': [('experimental', 'new', '6.0-1')]}
+
+        __save = (checkversions.query_madison, checkversions.get_apt_version_index,
+                  checkversions.get_newqueue_versions)
+        checkversions.query_madison = mock.MagicMock(side_effect=query_madison)
+        checkversions.get_apt_version_index = mock.MagicMock(return_value=None)
+        checkversions.get_newqueue_versions = mock.MagicMock(return_value=newqueue)
+
+        try:
+            stats = {}
+            packages = [('a', '1.0-1'), ('b', '1.0-1'), ('c', '1.0-1'), ('d', '1.0-1'),
+                        ('e', '1.0-1', 'e-src')]
+            results = list(checkversions.check_available_many(packages, 60, ('unstable',),
+                                                              jobs=2, batch=2, stats=stats))
+            self.assertEqual(results, [
+                ('a', '1.0-1', {'unstable': '2.0-1'}, False),
+                ('b', '1.0-1', {}, False),
+                ('c', '1.0-1', {}, True),
+                ('d', '1.0-1', {}, False),
+                ('e', '1.0-1', {'unstable': '5.0-1', 'experimental (new)': '6.0-1'}, False),
+            ])
+            self.assertIs(results[2][3], True)
+            self.assertIs(results[3][3], False)
+            self.assertEqual(stats, {'packages': 5, 'queries': 3})
+            self.assertEqual(sorted(call[0][0] for call in checkversions.query_madison.call_args_list),
+                             [['a', 'b'], ['c', 'd'], ['e']])
+            checkversions.get_newqueue_versions.assert_called_once()
+        finally:
+            (checkversions.query_madison, checkversions.get_apt_version_index,
+             checkversions.get_newqueue_versions) = __save
+
+
 class TestNewQueue(unittest.TestCase):
     def test_bts704040(self):
         # return an iterable object, so that Deb822 (what parses the result)
@@ -57,16 +134,99 @@ Source: aaa
 
         # save the original checkversions.open_url() method
         save_open_url = checkversions.open_url
+        save_index = checkversions._newqueue_index
 
-        checkversions.open_url = mock.MagicMock(return_value=pkg_in_new)
+        checkversions.open_url = mock.MagicMock(return_value='\n'.join(pkg_in_new))
+        tmpdir = tempfile.TemporaryDirectory()
+        checkversions._newqueue_index = checkversions.NewQueueIndex(
+            os.path.join(tmpdir.name, 'new.822.index'))
 
         res = checkversions.get_newqueue_available('procps', 60)
 
         self.assertEqual(list(res.keys())[0], 'experimental (new)')
         self.assertEqual(res['experimental (new)'], '1:3.3.7-1')
+        self.assertEqual(checkversions.get_newqueue_available('aaa', 60), {})
 
         # restore the original checkversions.open_url() method
         checkversions.open_url = save_open_url
+        checkversions._newqueue_index = save_index
+        tmpdir.cleanup()
+
+    def test_newqueue_index(self):
+        page = '''Source: foo
+Version: 1.0-1 1.1-1
+Distribution: unstable
+Queue: new
+
+Source: bar
+Version: 2.0-1
+Distribution: experimental
+Queue: new
+
+Source: foo
+Version: 1.2-1
+Distribution: experimental
+Queue: byhand
+'''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'new.822.index')
+            index = checkversions.NewQueueIndex(filename)
+            index.update(page)
+            self.assertEqual(index.versions('foo'), {'unstable (new)': '1.1-1',
+                                                     'experimental (byhand)': '1.2-1'})
+            self.assertEqual(index.versions('baz'), {})
+
+            # the index is read back, new.822 isn't parsed again
+            index = checkversions.NewQueueIndex(filename)
+            with mock.patch.object(checkversions.NewQueueIndex, 'parse') as parse:
+                index.update(page)
+                index.update(page)
+            parse.assert_not_called()
+            self.assertEqual(index.versions('bar'), {'experimental (new)': '2.0-1'})
+
+            # until it changes
+            index.update(page.replace('2.0-1', '2.1-1'))
+            self.assertEqual(index.versions('bar'), {'experimental (new)': '2.1-1'})
+
+
+    def test_newqueue_versions_cached(self):
+        page = 'Source: foo\nVersion: 1.0-1\nDistribution: unstable\nQueue: new\n'
+        tmpdir = tempfile.TemporaryDirectory()
+        cache = urlutils.HttpCache(os.path.join(tmpdir.name, 'http'))
+
+        def open_url(url, *args):
+            cache.store(url, page, etag='"1"')
+            return page
+
+        __save = (checkversions.open_url, checkversions._newqueue_index, urlutils._http_cache)
+        checkversions.open_url = mock.MagicMock(side_effect=open_url)
+        checkversions._newqueue_index = checkversions.NewQueueIndex(
+            os.path.join(tmpdir.name, 'new.822.index'))
+        urlutils._http_cache = cache
+        try:
+            self.assertEqual(checkversions.get_newqueue_available('foo', 60),
+                             {'unstable (new)': '1.0-1'})
+            # while the page is fresh, it isn't even read
+            with mock.patch.object(checkversions.NewQueueIndex, 'parse') as parse, \
+                    mock.patch.object(cache, 'get') as get:
+                self.assertEqual(checkversions.get_newqueue_available('foo', 60),
+                                 {'unstable (new)': '1.0-1'})
+                # nor when the index is read back
+                checkversions._newqueue_index = checkversions.NewQueueIndex(
+                    os.path.join(tmpdir.name, 'new.822.index'))
+                self.assertEqual(checkversions.get_newqueue_available('foo', 60),
+                                 {'unstable (new)': '1.0-1'})
+                # revalidated, but unchanged: not parsed again
+                cache.ttl = 0
+                checkversions.get_newqueue_available('foo', 60)
+            parse.assert_not_called()
+            get.assert_not_called()
+            self.assertEqual(checkversions.open_url.call_count, 2)
+            # the index isn't kept with the pages, where it would be evicted
+            self.assertEqual(os.path.dirname(checkversions.NewQueueIndex().filename), utils.CACHEDIR)
+        finally:
+            (checkversions.open_url, checkversions._newqueue_index, urlutils._http_cache) = __save
+            tmpdir.cleanup()
 
 
 class TestVersionAvailable(unittest.TestCase):
@@ -110,8 +270,11 @@ astroid    | 2.5.1-1       | unstable        | source
 """
         # save the original checkversions.open_url() method
         save_open_url = checkversions.open_url
+        save_index = checkversions.get_apt_version_index
 
         checkversions.open_url = mock.MagicMock(return_value=mixedpkg)
+        # whatever the APT lists of this system, ask madison
+        checkversions.get_apt_version_index = mock.MagicMock(return_value=None)
 
         res = checkversions.get_versions_available('astroid', 60)
 
@@ -122,3 +285,130 @@ astroid    | 2.5.1-1       | unstable        | source
 
         # restore the original checkversions.open_url() method
         checkversions.open_url = save_open_url
+        checkversions.get_apt_version_index = save_index
+
+
+class TestAptVersionIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.listsdir = os.path.join(self.tmpdir.name, 'lists')
+        os.mkdir(self.listsdir)
+        self.__save = utils.get_arch
+        utils.get_arch = lambda: 'amd64'
+
+        self.write('deb.debian.org_debian_dists_sid_InRelease',
+                   '-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA512\n\n'
+                   'Origin: Debian\nSuite: unstable\nCodename: sid\nSHA256:\n'
+                   ' 0123 456 main/binary-amd64/Packages\nSuite: bogus\n')
+        self.write('deb.debian.org_debian_dists_sid_main_binary-amd64_Packages',
+                   'Package: foo\nVersion: 1.0-1\nArchitecture: amd64\n\n'
+                   'Package: foo\nVersion: 1.2-1\nArchitecture: amd64\n\n'
+                   'Package: foo-doc\nVersion: 1.2-1\nArchitecture: all\n\n'
+                   'Package: bar\nVersion: 3.0-1\nArchitecture: i386\n')
+        self.write('deb.debian.org_debian_dists_bullseye_Release',
+                   'Origin: Debian\nCodename: bullseye\n')
+        self.write('deb.debian.org_debian_dists_bullseye_main_binary-amd64_Packages',
+                   'Package: foo\nVersion: 1.1-1\nArchitecture: amd64\n')
+        # a third-party repository, with a Debian-like suite name
+        self.write('example.org_debian_dists_unstable_InRelease',
+                   'Origin: Example\nSuite: unstable\n')
+        self.write('example.org_debian_dists_unstable_main_binary-amd64_Packages',
+                   'Package: foo\nVersion: 9.0-1\nArchitecture: amd64\n\n'
+                   'Package: baz\nVersion: 1.0-1\nArchitecture: amd64\n')
+
+    def tearDown(self):
+        utils.get_arch = self.__save
+        self.tmpdir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.listsdir, name), 'w') as fp:
+            fp.write(content)
+
+    def test_lookup(self):
+        index = checkversions.AptVersionIndex(':memory:', self.listsdir)
+        index.refresh()
+        self.assertEqual(index.suites(), {'unstable', 'stable'})
+
+        versions, missing = index.lookup('foo', ('stable', 'testing', 'sid'))
+        self.assertEqual(versions, {'unstable': '1.2-1', 'stable': '1.1-1'})
+        self.assertEqual(missing, ['testing'])
+        self.assertEqual(index.lookup('foo-doc', ('unstable',)), ({'unstable': '1.2-1'}, []))
+        # not for this architecture, or only in a third-party repository:
+        # madison is asked
+        self.assertEqual(index.lookup('bar', ('unstable',)), ({}, ['unstable']))
+        self.assertEqual(index.lookup('baz', ('stable', 'unstable')), ({}, ['stable', 'unstable']))
+
+    def test_refresh(self):
+        filename = os.path.join(self.tmpdir.name, 'apt-versions.sqlite')
+        index = checkversions.AptVersionIndex(filename, self.listsdir)
+        index.refresh()
+
+        # an updated list is reindexed, and only it
+        index = checkversions.AptVersionIndex(filename, self.listsdir)
+        self.write('deb.debian.org_debian_dists_sid_main_binary-amd64_Packages',
+                   'Package: foo\nVersion: 2.0-1\nArchitecture: amd64\n')
+        os.utime(self.listsdir, ns=(0, 0))
+        with mock.patch.object(index, '_index_list', wraps=index._index_list) as index_list:
+            index.refresh()
+        self.assertEqual([call[0][0] for call in index_list.call_args_list],
+                         ['deb.debian.org_debian_dists_sid_main_binary-amd64_Packages'])
+        self.assertEqual(index.lookup('foo', ('unstable',)), ({'unstable': '2.0-1'}, []))
+
+        os.unlink(os.path.join(self.listsdir, 'deb.debian.org_debian_dists_sid_main_binary-amd64_Packages'))
+        index.refresh()
+        self.assertEqual(index.lookup('foo', ('unstable',)), ({}, ['unstable']))
+
+    def test_get_apt_version_index(self):
+        save = checkversions._apt_version_index
+        index = checkversions._apt_version_index = checkversions.AptVersionIndex(':memory:', self.listsdir)
+        try:
+            # the lists changed: they are reindexed in the background, and
+            # madison is asked meanwhile
+            started = threading.Event()
+            refresh_lists = index.refresh
+
+            def slow_refresh():
+                started.wait(5)
+                refresh_lists()
+
+            with mock.patch.object(index, 'refresh', side_effect=slow_refresh) as refresh:
+                self.assertIsNone(checkversions.get_apt_version_index())
+                self.assertTrue(index.refreshing())
+                self.assertIsNone(checkversions.get_apt_version_index())
+                started.set()
+                index.thread.join()
+            self.assertEqual(refresh.call_count, 1)
+            self.assertIs(checkversions.get_apt_version_index(), index)
+            self.assertEqual(index.lookup('foo', ('unstable',)), ({'unstable': '1.2-1'}, []))
+
+            # unless there is nobody else to ask
+            self.write('deb.debian.org_debian_dists_sid_main_binary-amd64_Packages',
+                       'Package: foo\nVersion: 2.0-1\nArchitecture: amd64\n')
+            os.utime(self.listsdir, ns=(0, 0))
+            self.assertIs(checkversions.get_apt_version_index(wait=True), index)
+            self.assertFalse(index.refreshing())
+            self.assertEqual(index.lookup('foo', ('unstable',)), ({'unstable': '2.0-1'}, []))
+        finally:
+            checkversions._apt_version_index = save
+
+    def test_get_versions_available(self):
+        save = (checkversions.open_url, checkversions._apt_version_index)
+        checkversions._apt_version_index = checkversions.AptVersionIndex(':memory:', self.listsdir)
+        checkversions._apt_version_index.refresh()
+        checkversions.open_url = mock.MagicMock(
+            return_value='foo | 0.9-1 | bookworm | source, amd64\n')
+
+        # all the dists are in the lists: no network
+        self.assertEqual(checkversions.get_versions_available('foo', 60, ('unstable',)),
+                         {'unstable': '1.2-1'})
+        checkversions.open_url.assert_not_called()
+
+        # madison is only asked for the others
+        self.assertEqual(checkversions.get_versions_available('foo', 60, ('unstable', 'testing')),
+                         {'unstable': '1.2-1', 'testing': '0.9-1'})
+        self.assertIn('&s=testing&', checkversions.open_url.call_args[0][0])
+        self.assertEqual(checkversions.get_versions_available('foo', 60, ('unstable', 'testing'),
+                                                              local_only=True),
+                         {'unstable': '1.2-1'})
+
+        checkversions.open_url, checkversions._apt_version_index = save
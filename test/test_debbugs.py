@@ -8,6 +8,12 @@ from reportbug import debbugs
 from reportbug import urlutils
 
 import re
+import email
+import time
+import threading
+import datetime
+
+import debianbts
 
 
 class MockUI:
@@ -300,6 +306,13 @@ class TestInfofunc(unittest.TestCase):
         info = debbugs.generic_infofunc()
         self.assertIn('Architecture:', info)
 
+    def test_system_probes(self):
+        self.assertCountEqual(debbugs.system_probes('debian'),
+                              utils.REPORT_PROBES + ('debian_release', 'arch', 'multiarch'))
+        self.assertCountEqual(debbugs.system_probes('guug'), utils.REPORT_PROBES + ('lsb_release',))
+        for names in debbugs.INFOFUNC_PROBES.values():
+            self.assertLessEqual(set(names), set(utils.SYSTEM_PROBES))
+
 
 class TestMiscFunctions(unittest.TestCase):
     def test_yn_bool(self):
@@ -342,6 +355,85 @@ class TestMiscFunctions(unittest.TestCase):
         self.assertEqual(debbugs.debother, bdo_list)
 
 
+def bugreport(bug_num, severity='normal', log_modified=datetime.datetime(2020, 1, 1), done=False):
+    bug = debianbts.Bugreport()
+    bug.bug_num = bug_num
+    bug.severity = severity
+    bug.subject = 'bug %d' % bug_num
+    bug.tags = ['patch']
+    bug.mergedwith = []
+    bug.done = done
+    bug.log_modified = log_modified
+    return bug
+
+
+class TestBugStatusCache(unittest.TestCase):
+    def test_store_get(self):
+        cache = debbugs.BugStatusCache(':memory:')
+        now = time.time()
+        cache.store([bugreport(1, done=True), bugreport(2, log_modified=datetime.datetime.utcnow(), done=True),
+                     bugreport(4)], now=now)
+
+        found = cache.get([1, 2, 3, 4], now=now + 60)
+        self.assertEqual(sorted(found), [1, 2, 4])
+        self.assertEqual(found[1].__dict__, bugreport(1, done=True).__dict__)
+
+        # a closed bug quiet for years stays longer in the cache than an
+        # active one, but an open bug never does
+        found = cache.get([1, 2, 4], now=now + debbugs.BUG_CACHE_TTL + 60)
+        self.assertEqual(list(found), [1])
+        self.assertEqual(cache.get([1], now=now + debbugs.BUG_CACHE_MAX_TTL + 60), {})
+
+        cache.invalidate([1])
+        self.assertEqual(cache.get([1, 2], now=now), {2: mock.ANY})
+        # archived bugs are closed too
+        archived = bugreport(5)
+        archived.archived = True
+        cache.store([archived], now=now)
+        self.assertEqual(list(cache.get([5], now=now + debbugs.BUG_CACHE_TTL + 60)), [5])
+        cache.invalidate()
+        self.assertEqual(cache.get([1, 2], now=now), {})
+
+    def test_get_status(self):
+        __save = (debbugs.debianbts.get_status, debbugs._bug_status_cache)
+        debbugs.debianbts.get_status = mock.MagicMock(
+            side_effect=lambda bugs: [bugreport(bug) for bug in bugs])
+        debbugs._bug_status_cache = debbugs.BugStatusCache(':memory:')
+
+        try:
+            self.assertEqual(sorted(bug.bug_num for bug in debbugs.get_status([1, 2])), [1, 2])
+            # only the new bug is asked to the BTS
+            self.assertEqual(sorted(bug.bug_num for bug in debbugs.get_status([1, 2, 3])), [1, 2, 3])
+            # unless the cache is bypassed
+            self.assertEqual([bug.bug_num for bug in debbugs.get_status([2], cached=False)], [2])
+            self.assertEqual(debbugs.debianbts.get_status.call_args_list,
+                             [mock.call([1, 2]), mock.call([3]), mock.call([2])])
+        finally:
+            (debbugs.debianbts.get_status, debbugs._bug_status_cache) = __save
+
+    def test_listing_and_single_bug(self):
+        __save = (debbugs.debianbts.get_status, debbugs.debianbts.get_bugs,
+                  debbugs._bug_status_cache)
+        debbugs.debianbts.get_status = mock.MagicMock(
+            side_effect=lambda bugs: [bugreport(bug) for bug in bugs])
+        debbugs.debianbts.get_bugs = lambda **query: [1, 2] if 'package' in query else []
+        debbugs._bug_status_cache = debbugs.BugStatusCache(':memory:')
+
+        try:
+            self.assertEqual(debbugs.get_reports('reportbug', 5)[0], 2)
+            # the listing is served from the cache
+            self.assertEqual(debbugs.get_reports('reportbug', 5)[0], 2)
+            self.assertEqual(debbugs.debianbts.get_status.call_count, 1)
+            # but not the bug opened from it
+            status, log = debbugs.get_report(2, 5)
+            self.assertEqual(status.bug_num, 2)
+            self.assertEqual(debbugs.debianbts.get_status.call_args_list,
+                             [mock.call([1, 2]), mock.call([2])])
+        finally:
+            (debbugs.debianbts.get_status, debbugs.debianbts.get_bugs,
+             debbugs._bug_status_cache) = __save
+
+
 class TestGetReports(unittest.TestCase):
 
     @pytest.mark.network  # marking the test as using network
@@ -368,6 +460,323 @@ class TestGetReports(unittest.TestCase):
         self.assertGreater(data[0], 0)
 
 
+    def test_get_reports_concurrent(self):
+        found = {('src', 'linux'): [5, 3], ('affects', 'src:linux'): [3],
+                 ('package', 'linux-image-amd64'): [250, 1],
+                 ('affects', 'linux-image-amd64'): []}
+        severities = {1: 'normal', 3: 'serious', 5: 'normal', 7: 'wishlist', 250: 'normal'}
+        running = set()
+        concurrent = []
+
+        def get_bugs(**query):
+            (key, value), = query.items()
+            running.add(key + value)
+            concurrent.append(len(running))
+            time.sleep(0.05)
+            running.discard(key + value)
+            return found[(key, value)]
+
+        def get_status(bugs):
+            # answer out of order: the merge must not depend on it
+            return [bugreport(bug, severities[bug]) for bug in reversed(bugs)]
+
+        __save = (debbugs.debianbts.get_bugs, debbugs.debianbts.get_status, debbugs.STATUS_BATCH,
+                  debbugs._bug_status_cache)
+        debbugs.debianbts.get_bugs = mock.MagicMock(side_effect=get_bugs)
+        debbugs.debianbts.get_status = mock.MagicMock(side_effect=get_status)
+        debbugs.STATUS_BATCH = 2
+        debbugs._bug_status_cache = debbugs.BugStatusCache(':memory:')
+
+        count, title, hierarchy = debbugs.get_reports(['src:linux', 'linux-image-amd64', '7'], 60)
+
+        (debbugs.debianbts.get_bugs, debbugs.debianbts.get_status, debbugs.STATUS_BATCH,
+         debbugs._bug_status_cache) = __save
+
+        self.assertEqual(count, 5)
+        self.assertGreater(max(concurrent), 1)
+        self.assertEqual([[bug.bug_num for bug in bugs] for sev, bugs in hierarchy],
+                         [[3], [1, 5, 250], [7]])
+        self.assertEqual([sev for sev, bugs in hierarchy],
+                         ['Bugs with severity serious', 'Bugs with severity normal',
+                          'Bugs with severity wishlist'])
+
+
+class TestBugLog(unittest.TestCase):
+    def test_parse_mbox(self):
+        with open('test/data/bug.mbox', 'rb') as fp:
+            messages = list(debbugs.parse_mbox(fp))
+        self.assertEqual(len(messages), 2)
+
+        headers, body = messages[0]
+        self.assertEqual(headers['Subject'], 'foo: crashes on start')
+        self.assertEqual(body, 'Package: foo\nVersion: 1.0-1\n\nfoo crashes when started.\n\n'
+                               "From the backtrace, it's the config parser.\n")
+
+        headers, body = messages[1]
+        self.assertEqual(body, 'From which version on?\n')
+        self.assertEqual(debbugs.format_log_message(headers, body),
+                         'Date: Tue, 07 Jan 2020 10:00:00 +0100\n'
+                         'From: Foo Maintainer <maintainer@example.org>\n'
+                         'Subject: Re: Bug#123456: foo: crashes on start\n'
+                         '\nFrom which version on?\n')
+
+    def test_lazy(self):
+        more = threading.Event()
+
+        def messages():
+            yield 'original report'
+            more.wait(5)
+            yield 'followup'
+
+        log = debbugs.BugLog(messages())
+        self.assertIsNone(log.thread)
+        # the original report is there while the followups are still awaited
+        self.assertEqual(log[0], 'original report')
+        self.assertFalse(log.complete)
+        self.assertEqual(log.fetched(), 1)
+
+        more.set()
+        self.assertTrue(log.has(1))
+        self.assertFalse(log.has(2))
+        self.assertEqual(len(log), 2)
+        self.assertEqual(list(log), ['original report', 'followup'])
+        self.assertEqual(log[-1], 'followup')
+        with self.assertRaises(IndexError):
+            log[2]
+
+    def test_errors(self):
+        def messages(count):
+            yield from ['message'] * count
+            raise urlutils.NoNetwork
+
+        # without any message, the error is raised
+        log = debbugs.BugLog(messages(0))
+        with self.assertRaises(urlutils.NoNetwork):
+            bool(log)
+
+        # otherwise the log ends with the messages received, and says so
+        log = debbugs.BugLog(messages(1))
+        self.assertEqual(len(log), 2)
+        self.assertEqual(log[0], 'message')
+        self.assertIn('truncated', log[1])
+        self.assertIsInstance(log.error, urlutils.NoNetwork)
+
+    def test_decoded_body(self):
+        message = (b'From a@example.org Mon Jan  6 10:00:00 2020\n'
+                   b'Subject: =?iso-8859-1?q?caf=E9?=\n'
+                   b'Content-Type: text/plain; charset=iso-8859-1\n'
+                   b'Content-Transfer-Encoding: quoted-printable\n'
+                   b'\n'
+                   b'Caf=E9 cr=E8me\n'
+                   b'\n')
+        headers, body = debbugs.parse_mbox_message(message)
+        self.assertEqual(headers['Subject'], 'caf\xe9')
+        self.assertEqual(body, 'Caf\xe9 cr\xe8me\n')
+
+    def test_soap_fallback(self):
+        __save = debbugs.iter_bug_mbox, debianbts.get_bug_log
+
+        def offline(*args):
+            raise urlutils.NoNetwork
+            yield
+
+        debbugs.iter_bug_mbox = offline
+        debianbts.get_bug_log = lambda number: [{'message': email.message_from_string('Subject: soap\n\n'),
+                                                 'body': 'from SOAP\n'}]
+        try:
+            self.assertEqual(list(debbugs.iter_bug_log(123456, 5)), ['Subject: soap\n\nfrom SOAP\n'])
+        finally:
+            debbugs.iter_bug_mbox, debianbts.get_bug_log = __save
+
+    def test_get_report(self):
+        __save = debbugs.get_status, urlutils.iter_url_lines, debbugs._bug_log_store
+        debbugs._bug_log_store = debbugs.BugLogStore(':memory:')
+        fetched = []
+
+        def iter_url_lines(url, http_proxy, timeout):
+            fetched.append(url)
+            with open('test/data/bug.mbox', 'rb') as fp:
+                yield from fp
+
+        debbugs.get_status = lambda bugs, cached=True: [bugreport(bugs[0])]
+        urlutils.iter_url_lines = iter_url_lines
+        try:
+            status, log = debbugs.get_report(123456, 5)
+            self.assertEqual(status.bug_num, 123456)
+            # nothing downloaded until a message is needed
+            self.assertEqual(fetched, [])
+            self.assertTrue(log[0].endswith("From the backtrace, it's the config parser.\n"))
+            self.assertEqual(len(log), 2)
+            self.assertEqual(fetched, [debbugs.get_report_url('debian', 123456, mbox=True)])
+
+            # viewed again: served from the store
+            status, log = debbugs.get_report(123456, 5)
+            self.assertEqual(len(log), 2)
+            self.assertEqual(len(fetched), 1)
+        finally:
+            debbugs.get_status, urlutils.iter_url_lines, debbugs._bug_log_store = __save
+
+
+class TestBugLogStore(unittest.TestCase):
+    def setUp(self):
+        with open('test/data/bug.mbox', 'rb') as fp:
+            self.messages = list(debbugs.split_mbox(fp))
+        self.store = debbugs.BugLogStore(':memory:')
+        self.modified = datetime.datetime(2020, 1, 7)
+
+    def test_split_mbox(self):
+        self.assertEqual(len(self.messages), 2)
+        with open('test/data/bug.mbox', 'rb') as fp:
+            self.assertEqual(b''.join(self.messages), fp.read())
+
+    def test_store_get(self):
+        self.assertIsNone(self.store.get(123456, self.modified))
+        self.store.store(123456, self.modified, self.messages)
+        self.assertEqual(self.store.get(123456, self.modified), self.messages)
+        self.assertEqual(self.store.get(123456), self.messages)
+        # the bug changed since
+        self.assertIsNone(self.store.get(123456, datetime.datetime(2020, 2, 1)))
+        # another BTS, or the archive, have their own logs
+        self.assertIsNone(self.store.get(123456, system='ubuntu'))
+        self.assertIsNone(self.store.get(123456, archived='yes'))
+        self.assertEqual(self.store.get(123456, archived='no'), self.messages)
+
+        self.store.invalidate([123456])
+        self.assertIsNone(self.store.get(123456))
+
+    def test_eviction(self):
+        for i, number in enumerate((1, 2, 3)):
+            self.store.store(number, self.modified, self.messages, now=i)
+        self.store.get(1, now=10)
+
+        # room for two logs
+        self.store.maxsize = 2 * self.store.db.execute('SELECT size FROM logs WHERE bug_num = 1').fetchone()[0]
+        self.store.store(4, self.modified, self.messages, now=20)
+        self.assertEqual([row[0] for row in self.store.db.execute('SELECT bug_num FROM logs ORDER BY bug_num')],
+                         [1, 4])
+        self.assertEqual(self.store.db.execute('SELECT COUNT(*) FROM messages').fetchone()[0], 4)
+
+    def test_iter_bug_mbox(self):
+        __save = debbugs.get_status, urlutils.iter_url_lines, debbugs._bug_log_store
+        debbugs._bug_log_store = self.store
+        self.store.store(123456, self.modified, self.messages)
+
+        def offline(*args, **kwargs):
+            raise urlutils.NoNetwork
+
+        urlutils.iter_url_lines = offline
+        try:
+            debbugs.get_status = lambda bugs, cached=True: [bugreport(bugs[0], log_modified=self.modified)]
+            self.assertEqual(b''.join(debbugs.iter_bug_mbox(123456, 5)), b''.join(self.messages))
+            # even the status can't be fetched
+            debbugs.get_status = offline
+            self.assertEqual(b''.join(debbugs.iter_bug_mbox(123456, 5)), b''.join(self.messages))
+            # nor for another BTS, which has no status to check against
+            debbugs.SYSTEMS['other'] = {'cgiroot': 'https://bugs.example.org/cgi-bin/'}
+            try:
+                with self.assertRaises(urlutils.NoNetwork):
+                    list(debbugs.iter_bug_mbox(123456, 5, 'other'))
+            finally:
+                del debbugs.SYSTEMS['other']
+            # but a changed bug is fetched again
+            debbugs.get_status = lambda bugs, cached=True: [bugreport(bugs[0])]
+            with self.assertRaises(urlutils.NoNetwork):
+                list(debbugs.iter_bug_mbox(123456, 5))
+
+            # logs over the budget are streamed without being kept
+            urlutils.iter_url_lines = lambda *args: open('test/data/bug.mbox', 'rb')
+            self.store.maxsize = 10
+            self.assertEqual(list(debbugs.iter_bug_mbox(654321, 5)), self.messages)
+            self.assertIsNone(self.store.get(654321))
+        finally:
+            debbugs.get_status, urlutils.iter_url_lines, debbugs._bug_log_store = __save
+
+
+class TestGetMboxes(unittest.TestCase):
+    def test_get_mboxes(self):
+        __save = debbugs.get_status, debbugs.iter_bug_mbox
+        lock = threading.Lock()
+        running = []
+        seen = []
+
+        def iter_bug_mbox(number, *args):
+            with lock:
+                running.append(number)
+                seen.append(len(running))
+            try:
+                # the first bugs are the slowest ones
+                time.sleep(0.01 * (6 - number))
+                if number == 3:
+                    raise urlutils.NoNetwork('timed out')
+                yield b'From %d\n' % number
+                yield b'message\n'
+            finally:
+                with lock:
+                    running.remove(number)
+
+        debbugs.get_status = lambda bugs, cached=True: []
+        debbugs.iter_bug_mbox = iter_bug_mbox
+        try:
+            stats = {}
+            results = [(number, list(mbox), mbox.error)
+                       for number, mbox in debbugs.get_mboxes([1, 2, 3, 4, 5], 5, jobs=2, stats=stats)]
+
+            # an mbox given up stops its download
+            mboxes = debbugs.get_mboxes([5, 4], 5, jobs=2)
+            number, mbox = next(mboxes)
+            mboxes.close()
+        finally:
+            debbugs.get_status, debbugs.iter_bug_mbox = __save
+
+        self.assertEqual([number for number, messages, error in results], [1, 2, 3, 4, 5])
+        self.assertEqual(results[0][1], [b'From 1\n', b'message\n'])
+        self.assertEqual(results[2][1], [])
+        self.assertIsInstance(results[2][2], urlutils.NoNetwork)
+        self.assertIsNone(results[4][2])
+        self.assertLessEqual(max(seen), 2)
+        self.assertEqual(stats, {'bugs': 5, 'messages': 8, 'bytes': 60, 'errors': 1})
+        self.assertEqual(running, [])
+
+    def test_mbox_spool(self):
+        __save = debbugs.iter_bug_mbox, debbugs.MBOX_STREAM_QUEUE
+        started = threading.Event()
+        sent = []
+
+        def iter_bug_mbox(number, *args):
+            for i in range(10):
+                if i == 3:
+                    # read from now on
+                    started.wait()
+                sent.append(i)
+                yield b'From %d\n' % i
+
+        debbugs.iter_bug_mbox = iter_bug_mbox
+        debbugs.MBOX_STREAM_QUEUE = 2
+        try:
+            stats = {'messages': 0, 'bytes': 0, 'errors': 0}
+            spool = debbugs._MboxSpool(stats)
+            thread = threading.Thread(target=spool.fill, args=(1, 5, 'debian', None, '', False, None))
+            thread.start()
+            while len(spool.sizes) < 3:
+                time.sleep(0.001)
+            messages = iter(spool)
+            # the messages before the reader came were spooled
+            self.assertEqual(next(messages), b'From 0\n')
+            started.set()
+            self.assertEqual(next(messages), b'From 1\n')
+            time.sleep(0.05)
+            # the rest is handed over no further than the queue allows
+            self.assertLessEqual(len(sent), 6)
+            self.assertEqual(list(messages), [b'From %d\n' % i for i in range(2, 10)])
+        finally:
+            started.set()
+            thread.join()
+            debbugs.iter_bug_mbox, debbugs.MBOX_STREAM_QUEUE = __save
+        self.assertEqual(spool.sizes, [7, 7, 7])
+        self.assertIsNone(spool.error)
+        self.assertEqual(stats, {'messages': 10, 'bytes': 70, 'errors': 0})
+
+
 class TestUrlFunctions(unittest.TestCase):
     def test_cgi_report_url(self):
         self.assertCountEqual(debbugs.cgi_report_url('debian', 123).split('?')[1].split('&'),
@@ -21,3 +21,44 @@ class TestHiermatch(unittest.TestCase):
 
         matches = hiermatch.egrep_list(test_strings_list, 'better')
         self.assertEqual(len(matches), 6)
+
+    def test_egrep_hierarchy(self):
+        hier = [('better', test_strings_list[:3]), ('worse', test_strings_list[3:])]
+        self.assertEqual(hiermatch.egrep_hierarchy(hier, 'than (ugly|complex)'), [[0, 2], []])
+        # only among the given indexes
+        self.assertEqual(hiermatch.egrep_hierarchy(hier, 'is', [[1, 2], [0]]), [[1, 2], [0]])
+        self.assertEqual(hiermatch.matched_hierarchy(hier, 'than (ugly|complex)', [[2], []]),
+                         [('better', [test_strings_list[2]])])
+
+
+class TestHierarchyIndex(unittest.TestCase):
+    def setUp(self):
+        self.hier = [('Bugs with severity normal',
+                      ['#%d  %s' % (100 + i, s) for i, s in enumerate(test_strings_list[:4])]),
+                     ('Bugs with severity wishlist',
+                      ['#%d  %s' % (200 + i, s) for i, s in enumerate(test_strings_list[4:])])]
+        self.index = hiermatch.HierarchyIndex(self.hier)
+
+    def test_search(self):
+        subhier = self.index.search('COMPLEX')
+        self.assertEqual(subhier, [[2, 3], []])
+        self.assertEqual(subhier, hiermatch.egrep_hierarchy(self.hier, 'COMPLEX'))
+        self.assertEqual(self.index.bugs(subhier), [102, 103])
+        self.assertEqual(self.index.hierarchy(subhier), [('Bugs with severity normal',
+                                                          ['#102  Simple is better than complex.',
+                                                           '#103  Complex is better than complicated.'])])
+
+        subhier = self.index.search(r'than \w+ed\.$')
+        self.assertEqual(self.index.bugs(subhier), [103, 200])
+
+        with self.assertRaises(exceptions.InvalidRegex):
+            self.index.search('(')
+
+    def test_narrow(self):
+        subhier = self.index.search('is better')
+        self.assertEqual(self.index.bugs(subhier), [100, 101, 102, 103, 200, 201])
+        # a filter in a filter only looks at the previous matches
+        subhier = self.index.search('^#20', subhier)
+        self.assertEqual(subhier, [[], [0, 1]])
+        self.assertEqual(self.index.bugs(self.index.search('ex', subhier)), [])
+        self.assertEqual(self.index.bugs(self.index.search('dense', subhier)), [201])
@@ -0,0 +1,105 @@
+""" Unit test for reportbug.integrity module """
+
+import os
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+from reportbug import integrity
+
+
+class TestIntegrity(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.infodir = os.path.join(self.root, 'info')
+        os.mkdir(self.infodir)
+        os.mkdir(os.path.join(self.root, 'files'))
+
+        self.files = {}
+        for name in ('good', 'changed', 'missing', 'excluded', 'diverted'):
+            path = os.path.join(self.root, 'files', name)
+            self.files[name] = path
+            with open(path, 'w') as fp:
+                fp.write('content of %s\n' % name)
+
+        with open(os.path.join(self.infodir, 'foo:amd64.md5sums'), 'w') as fp:
+            for name, path in self.files.items():
+                digest = hashlib.md5(('content of %s\n' % name).encode()).hexdigest()
+                fp.write('%s  %s\n' % (digest, path.lstrip('/')))
+
+        with open(self.files['changed'], 'a') as fp:
+            fp.write('local change\n')
+        os.unlink(self.files['missing'])
+        os.unlink(self.files['excluded'])
+        os.rename(self.files['diverted'], self.files['diverted'] + '.orig')
+        with open(self.files['diverted'], 'w') as fp:
+            fp.write('the diverting package version\n')
+
+        self.diversions = {self.files['diverted']: (self.files['diverted'] + '.orig', 'bar')}
+        self.filters = [(True, os.path.join(self.root, 'files', 'ex*')),
+                        (False, os.path.join(self.root, 'files', 'g*'))]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_md5sums_file(self):
+        filename = os.path.join(self.infodir, 'foo:amd64.md5sums')
+        self.assertEqual(integrity.md5sums_file('foo', self.infodir), filename)
+        self.assertEqual(integrity.md5sums_file('foo:amd64', self.infodir), filename)
+        self.assertIsNone(integrity.md5sums_file('foo:i386', self.infodir))
+        self.assertIsNone(integrity.md5sums_file('bar', self.infodir))
+
+        self.assertEqual([path for path, md5sum in integrity.read_md5sums(filename)],
+                         list(self.files.values()))
+
+    def test_md5sums_file_native(self):
+        for arch in ('amd64', 'i386', 'arm64'):
+            open(os.path.join(self.infodir, 'bar:%s.md5sums' % arch), 'w').close()
+        self.assertEqual(integrity.md5sums_file('bar', self.infodir, 'i386'),
+                         os.path.join(self.infodir, 'bar:i386.md5sums'))
+        with mock.patch('reportbug.utils.get_arch', return_value='arm64'):
+            self.assertEqual(integrity.md5sums_file('bar', self.infodir),
+                             os.path.join(self.infodir, 'bar:arm64.md5sums'))
+        # not installed for the native architecture
+        self.assertEqual(integrity.md5sums_file('bar', self.infodir, 's390x'),
+                         os.path.join(self.infodir, 'bar:amd64.md5sums'))
+
+    def test_is_excluded(self):
+        self.assertTrue(integrity.is_excluded(self.files['excluded'], self.filters))
+        self.assertFalse(integrity.is_excluded(self.files['missing'], self.filters))
+        self.assertFalse(integrity.is_excluded('/usr/share/doc/foo/copyright',
+                                               [(True, '/usr/share/doc/*'),
+                                                (False, '/usr/share/doc/*/copyright')]))
+
+    def test_verify_package(self):
+        problems = integrity.verify_package('foo', jobs=2, infodir=self.infodir,
+                                            diversions=self.diversions,
+                                            filters=self.filters)
+        self.assertEqual(problems, [
+            'debsums: changed file %s (from foo:amd64 package)' % self.files['changed'],
+            'debsums: missing file %s (from foo:amd64 package)' % self.files['missing'],
+        ])
+
+        self.assertEqual(integrity.verify_package('bar', infodir=self.infodir), [])
+
+    def test_invalid_lines(self):
+        filename = os.path.join(self.infodir, 'foo:amd64.md5sums')
+        with open(filename, 'a') as fp:
+            fp.write('truncated-line\n')
+            fp.write('not-a-md5sum  usr/share/doc/foo/README\n')
+
+        invalid = []
+        md5sums = integrity.read_md5sums(filename, invalid)
+        self.assertEqual([path for path, md5sum in md5sums], list(self.files.values()))
+        self.assertEqual(invalid, [6, 7])
+
+        problems = integrity.verify_package('foo', jobs=2, infodir=self.infodir,
+                                            diversions=self.diversions,
+                                            filters=self.filters)
+        self.assertEqual(problems[:2], [
+            'debsums: invalid line 6 in md5sums for foo:amd64 package',
+            'debsums: invalid line 7 in md5sums for foo:amd64 package',
+        ])
+        self.assertEqual(len(problems), 4)
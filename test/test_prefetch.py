@@ -0,0 +1,62 @@
+""" Unit test for reportbug.prefetch module """
+
+import threading
+import unittest
+from unittest import mock
+
+from reportbug import prefetch
+
+
+def query(package, timeout, archived='no'):
+    return (package, timeout, archived, threading.current_thread().name)
+
+
+class TestPrefetcher(unittest.TestCase):
+    def test_result(self):
+        prefetcher = prefetch.Prefetcher()
+        future = prefetcher.submit(query, 'foo', 60)
+        # the same call, however the arguments are given
+        self.assertIs(prefetcher.submit(query, 'foo', timeout=60, archived='no'), future)
+
+        self.assertEqual(prefetcher.result(query, package='foo', timeout=60),
+                         ('foo', 60, 'no', 'prefetch-query'))
+        # each result is only used once
+        self.assertEqual(prefetcher.result(query, 'foo', 60),
+                         ('foo', 60, 'no', threading.current_thread().name))
+
+    def test_exception(self):
+        prefetcher = prefetch.Prefetcher()
+        failing = mock.MagicMock(side_effect=IOError('no network'), __name__='failing')
+        prefetcher.submit(failing, 'foo')
+        with self.assertRaises(IOError):
+            prefetcher.result(failing, 'foo')
+        self.assertEqual(failing.call_count, 1)
+
+    def test_cancel(self):
+        prefetcher = prefetch.Prefetcher()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(package):
+            started.set()
+            release.wait(10)
+            return 'slow'
+
+        future = prefetcher.submit(slow, 'foo')
+        started.wait(10)
+        prefetcher.cancel()
+        self.assertIsNone(prefetcher.submit(query, 'foo', 60))
+        self.assertEqual(prefetcher.futures, {})
+
+        # a cancelled prefetch doesn't keep anybody waiting
+        release.set()
+        self.assertEqual(prefetcher.result(query, 'foo', 60)[0], 'foo')
+        self.assertEqual(future.result(10), 'slow')
+
+    def test_get_prefetcher(self):
+        __save = prefetch._prefetcher
+        prefetch._prefetcher = None
+        prefetcher = prefetch.get_prefetcher()
+        self.assertIsInstance(prefetcher, prefetch.Prefetcher)
+        self.assertIs(prefetch.get_prefetcher(), prefetcher)
+        prefetch._prefetcher = __save
@@ -1,6 +1,11 @@
 """ Unit test for reportbug.ui module """
 
+import os
+import subprocess
+import sys
+import textwrap
 import unittest
+from unittest import mock
 
 from reportbug import ui
 from reportbug.ui import __LOADED_UIS as LOADED_UIS
@@ -12,7 +17,71 @@ class TestUI(unittest.TestCase):
         self.assertCountEqual(ui.AVAILABLE_UIS, ['text', 'urwid', 'gtk'])
 
     def test_getUI(self):
-        for loaded_ui in list(LOADED_UIS.keys()):
-            self.assertEqual(ui.getUI(loaded_ui), LOADED_UIS[loaded_ui])
+        # the UIs are only loaded on demand: ask for each of them
+        for name in list(ui.AVAILABLE_UIS):
+            loaded_ui = ui.getUI(name)
+            if name in ui.AVAILABLE_UIS:
+                self.assertIs(loaded_ui, LOADED_UIS[name])
+                self.assertEqual(loaded_ui.__name__, 'reportbug.ui.%s_ui' % name)
+            else:
+                # it failed to import: the text UI is used instead
+                self.assertIs(loaded_ui, LOADED_UIS['text'])
+            self.assertIs(ui.getUI(name), loaded_ui)
 
-        self.assertEqual(ui.getUI('non-existing'), LOADED_UIS['text'])
+        self.assertIn('text', LOADED_UIS)
+        self.assertEqual(LOADED_UIS['text'].__name__, 'reportbug.ui.text_ui')
+        self.assertIs(ui.getUI('non-existing'), LOADED_UIS['text'])
+
+    def test_uis_not_imported(self):
+        # a fresh interpreter, as the UIs may be imported already in this one
+        code = textwrap.dedent("""\
+            import sys
+            import reportbug.ui
+            loaded = [m for m in sys.modules
+                      if m.startswith(('reportbug.ui.', 'gi.repository')) or m == 'urwid']
+            assert not loaded, loaded
+            """)
+        # with a display, so that the GTK typelibs are looked for
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       env=dict(os.environ, DISPLAY=':0'),
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def test_check_ui(self):
+        with mock.patch.dict(os.environ, {'DISPLAY': ':0'}), \
+                mock.patch('importlib.util.find_spec', return_value=None):
+            self.assertIsNone(ui._check_ui('text'))
+            self.assertIn('python3-urwid', ui._check_ui('urwid'))
+            self.assertIn('reportbug-gtk', ui._check_ui('gtk'))
+
+        # gi is there, but maybe not the typelibs
+        typelibs = {'Gtk': ['3.0'], 'GtkSource': ['4'], 'Vte': ['2.91']}
+        gi = mock.Mock()
+        gi.Repository.get_default().enumerate_versions.side_effect = lambda name: typelibs[name]
+        with mock.patch.dict(os.environ, {'DISPLAY': ':0'}), \
+                mock.patch('importlib.util.find_spec', return_value=mock.ANY), \
+                mock.patch.dict(sys.modules, {'gi': gi}):
+            self.assertIsNone(ui._check_ui('gtk'))
+            typelibs['Vte'] = []
+            self.assertIn('reportbug-gtk', ui._check_ui('gtk'))
+            typelibs['Vte'] = ['2.91']
+            typelibs['Gtk'] = ['4.0']
+            self.assertIn('reportbug-gtk', ui._check_ui('gtk'))
+
+        with mock.patch.dict(os.environ, {'DISPLAY': '', 'WAYLAND_DISPLAY': ''}):
+            del os.environ['DISPLAY']
+            del os.environ['WAYLAND_DISPLAY']
+            self.assertIn('No graphical display', ui._check_ui('gtk'))
+
+    def test_getUI_unimportable(self):
+        __save = (dict(ui.AVAILABLE_UIS), dict(ui.UNAVAILABLE_UIS))
+        ui.AVAILABLE_UIS['broken'] = 'A broken user interface'
+
+        self.assertEqual(ui.getUI('broken'), ui.getUI('text'))
+        self.assertNotIn('broken', ui.AVAILABLE_UIS)
+        self.assertIn('broken', ui.UNAVAILABLE_UIS)
+        self.assertNotIn('broken', LOADED_UIS)
+
+        ui.AVAILABLE_UIS.clear()
+        ui.AVAILABLE_UIS.update(__save[0])
+        ui.UNAVAILABLE_UIS.clear()
+        ui.UNAVAILABLE_UIS.update(__save[1])
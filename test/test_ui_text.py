@@ -0,0 +1,47 @@
+""" Unit test for reportbug.ui.text_ui module """
+
+import unittest
+
+from reportbug.ui import text_ui
+
+
+class TestCompleter(unittest.TestCase):
+    names = ['reportbug', 'python3-reportbug', 'reportbug-gtk', 'other',
+             'python3', 'reportbug', 'r']
+
+    def complete_all(self, completer, text):
+        ret = []
+        while True:
+            match = completer.complete(text, len(ret))
+            if match is None:
+                return ret
+            ret.append(match)
+
+    def test_our_completer(self):
+        completer = text_ui.our_completer(self.names)
+
+        self.assertEqual(self.complete_all(completer, 'report'),
+                         ['reportbug', 'reportbug-gtk'])
+        self.assertEqual(self.complete_all(completer, 'r'),
+                         ['r', 'reportbug', 'reportbug-gtk'])
+        self.assertEqual(self.complete_all(completer, 'python3'),
+                         ['python3', 'python3-reportbug'])
+        self.assertEqual(self.complete_all(completer, 'zzz'), [])
+        self.assertEqual(self.complete_all(completer, ''), sorted(set(self.names)))
+
+        # same results as a plain scan
+        for text in ['', 'p', 'py', 'reportbug-', 'o', 'x']:
+            self.assertEqual(self.complete_all(completer, text),
+                             sorted(set(x for x in self.names if x.startswith(text))))
+
+        self.assertIsNone(text_ui.our_completer().complete('r', 0))
+
+    def test_get_completer(self):
+        complete = text_ui.get_completer(self.names)
+        self.assertEqual(complete('o', 0), 'other')
+        # the index is reused for the same completions...
+        self.assertIs(text_ui.get_completer(self.names).__self__, complete.__self__)
+        # ... and rebuilt for new ones
+        other = text_ui.get_completer(['foo'])
+        self.assertIsNot(other.__self__, complete.__self__)
+        self.assertEqual(other('f', 0), 'foo')
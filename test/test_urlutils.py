@@ -1,6 +1,14 @@
+import http.server
+import os
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 import pytest
+import requests
 
 from reportbug import urlutils
 
@@ -12,3 +20,187 @@ class TestNetwork(unittest.TestCase):
 
         page = urlutils.open_url('https://bugs.debian.org/reportbug')
         self.assertIsNotNone(page)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        etag = '"%s"' % self.path
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/slow':
+            # no answer in time; the client has given up
+            time.sleep(0.5)
+            self.close_connection = True
+            return
+        body = ('page %s' % self.path).encode()
+        if self.path == '/lines':
+            body = b'first line\nsecond line\n\nlast line'
+        self.send_response(200)
+        if self.path in ('/no-store', '/no-cache', '/private'):
+            self.send_header('Cache-Control', 'max-age=60, ' + self.path[1:])
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.__save = urlutils._http_cache
+        urlutils._http_cache = urlutils.HttpCache(self.tmpdir.name)
+
+    def tearDown(self):
+        urlutils._http_cache = self.__save
+        self.tmpdir.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def urlopen(self, path):
+        return urlutils.urlopen(self.url + path, proxies={'no_proxy': '127.0.0.1'}, timeout=5)
+
+    def test_connections_reused(self):
+        before = urlutils.connection_stats()
+        timeout = socket.getdefaulttimeout()
+        for i in range(3):
+            page = self.urlopen(str(i))
+            self.assertEqual(page, 'page /%d' % i)
+        after = urlutils.connection_stats()
+
+        self.assertEqual(after['requests'] - before['requests'], 3)
+        self.assertEqual(after['opened'] - before['opened'], 1)
+        self.assertEqual(after['reused'] - before['reused'], 2)
+        self.assertIs(urlutils.get_session(), urlutils.get_session())
+        self.assertEqual(socket.getdefaulttimeout(), timeout)
+
+    def test_read_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(requests.exceptions.RequestException):
+            urlutils.urlopen(self.url + 'slow', proxies={'no_proxy': '127.0.0.1'}, timeout=0.2)
+        # not asked again: the timeout bounds the wait
+        self.assertEqual(self.server.requests, [('/slow', None)])
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_connect_error(self):
+        # a port nothing listens on
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/' % sock.getsockname()[1]
+        start = time.monotonic()
+        try:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                urlutils.urlopen(url, proxies={'no_proxy': '127.0.0.1'}, timeout=5)
+        finally:
+            sock.close()
+        # not tried again, with backoff
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_http_cache(self):
+        cache = urlutils.get_http_cache()
+        self.assertEqual(self.urlopen('new.822'), 'page /new.822')
+        # fresh: not even asked to the server
+        self.assertEqual(self.urlopen('new.822'), 'page /new.822')
+        self.assertEqual(self.server.requests, [('/new.822', None)])
+
+        # stale: revalidated, not downloaded again
+        cache.ttl = 0
+        self.assertEqual(self.urlopen('new.822'), 'page /new.822')
+        self.assertEqual(self.server.requests[1], ('/new.822', '"/new.822"'))
+        meta, body = cache.get(self.url + 'new.822')
+        self.assertEqual(meta['etag'], '"/new.822"')
+        self.assertEqual(body, 'page /new.822')
+
+    def test_cache_control(self):
+        cache = urlutils.get_http_cache()
+        for path in ('no-store', 'private'):
+            self.assertEqual(self.urlopen(path), 'page /' + path)
+            self.assertIsNone(cache.get(self.url + path))
+        # kept, but asked again each time
+        self.assertEqual(self.urlopen('no-cache'), 'page /no-cache')
+        self.assertEqual(self.urlopen('no-cache'), 'page /no-cache')
+        self.assertEqual(self.server.requests,
+                         [('/no-store', None), ('/private', None),
+                          ('/no-cache', None), ('/no-cache', '"/no-cache"')])
+
+    def test_http_cache_size(self):
+        cache = urlutils.get_http_cache()
+        cache._evict = mock.MagicMock(wraps=cache._evict)
+        for i, path in enumerate(('a', 'b')):
+            cache.store(self.url + path, 'x' * 100)
+            os.utime(cache.filename(self.url + path), (i, i))
+        # the directory is only scanned on the first store
+        self.assertEqual(cache._evict.call_count, 1)
+        self.assertEqual(cache.size, sum(os.path.getsize(cache.filename(self.url + path))
+                                         for path in ('a', 'b')))
+
+        cache.store(self.url + 'b', 'x' * 50)
+        self.assertEqual(cache.size, sum(os.path.getsize(cache.filename(self.url + path))
+                                         for path in ('a', 'b')))
+        self.assertEqual(cache._evict.call_count, 1)
+
+        # and when it grows over maxsize (the metadata lengths vary a bit)
+        cache.maxsize = cache.size + 10
+        cache.store(self.url + 'c', 'x' * 100)
+        self.assertEqual(cache._evict.call_count, 2)
+        self.assertIsNone(cache.get(self.url + 'a'))
+        self.assertEqual(cache.size, sum(os.path.getsize(cache.filename(self.url + path))
+                                         for path in ('b', 'c')))
+
+    def test_http_cache_size_threads(self):
+        cache = urlutils.get_http_cache()
+        paths = ['%d-%d' % (i, j) for i in range(8) for j in range(20)]
+
+        def store(i):
+            for path in paths[i * 20:(i + 1) * 20]:
+                cache.store(self.url + path, 'x' * 100)
+                cache.store(self.url + path, 'x' * 50)
+        threads = [threading.Thread(target=store, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.size, sum(os.path.getsize(cache.filename(self.url + path))
+                                         for path in paths))
+
+    def test_http_cache_eviction(self):
+        cache = urlutils.get_http_cache()
+        for i, path in enumerate(('a', 'b', 'c')):
+            cache.store(self.url + path, 'x' * 100)
+            # make the order of use unambiguous
+            os.utime(cache.filename(self.url + path), (i, i))
+        cache.touch(self.url + 'a')
+
+        # room for two pages
+        cache.maxsize = sum(os.path.getsize(cache.filename(self.url + path))
+                            for path in ('a', 'c'))
+        cache.evict()
+        self.assertIsNotNone(cache.get(self.url + 'a'))
+        self.assertIsNone(cache.get(self.url + 'b'))
+        self.assertIsNotNone(cache.get(self.url + 'c'))
+
+    def test_iter_url_lines(self):
+        proxy = None
+        for chunk_size in (3, 1024):
+            lines = list(urlutils.iter_url_lines(self.url + 'lines', proxy, 5, chunk_size))
+            self.assertEqual(lines, [b'first line\n', b'second line\n', b'\n', b'last line'])
+        self.assertEqual(list(urlutils.iter_url_lines(self.url + 'missing', proxy, 5)), [])
+        # streamed pages don't go to the HTTP cache
+        self.assertIsNone(urlutils.get_http_cache().get(self.url + 'lines'))
@@ -10,7 +10,11 @@ import os.path
 import platform
 import debianbts
 import subprocess
+import sys
 import email
+import io
+import tempfile
+import time
 import textwrap
 
 
@@ -183,14 +187,85 @@ class TestPackages(unittest.TestCase):
                               '/etc/reportbug.conf.obsolete',
                               '/etc/reportbug with spaces and obsolete.conf']
 
-        __save = utils.get_command_output
+        __save1 = utils.get_command_output
+        __save2 = utils.get_dpkg_status_db
         utils.get_command_output = mock.MagicMock(return_value=pkgstatus)
+        # force the fallback to dpkg --status
+        utils.get_dpkg_status_db = mock.MagicMock(return_value=None)
         result = utils.get_package_status(pkg)
         conffile = [x[0] for x in result[4]]
-        utils.get_command_output = __save
-        del __save
+        utils.get_command_output = __save1
+        utils.get_dpkg_status_db = __save2
+        del __save1
+        del __save2
         self.assertListEqual(conffile, expected_conffiles)
 
+    def test_dpkg_status_db(self):
+        db = utils.DpkgStatusDB(os.path.dirname(__file__) + '/data/dpkg-status')
+
+        self.assertCountEqual(db.packages(),
+                              ['reportbug', 'libfoo1', 'purged', 'removed', 'mawk'])
+        self.assertEqual(len(list(db.paragraphs())), 6)
+        self.assertTrue(db.is_current())
+
+        stanza = db.lookup('reportbug')
+        self.assertTrue(stanza.startswith('Package: reportbug\n'))
+        self.assertTrue(stanza.endswith('Homepage: https://salsa.debian.org/reportbug-team/reportbug'))
+
+        # Multi-Arch: same packages
+        self.assertIn('Version: 1.2-3+b1', db.lookup('libfoo1'))
+        self.assertIn('Version: 1.2-3+b1', db.lookup('libfoo1:amd64'))
+        self.assertIn('Version: 1.2-3\n', db.lookup('libfoo1:i386'))
+        self.assertIsNone(db.lookup('libfoo1:arm64'))
+
+        # dpkg --status doesn't report purged packages either
+        self.assertIsNone(db.lookup('purged'))
+        self.assertIsNone(db.lookup('non-existing-package'))
+
+        self.assertEqual(db.installed(), [('libfoo1', '1.2-3+b1', 'foo'),
+                                          ('mawk', '1.3.4.20200120-3.1', 'mawk'),
+                                          ('reportbug', '11.1.0', 'reportbug')])
+
+    def test_get_package_status_from_status_db(self):
+        db = utils.DpkgStatusDB(os.path.dirname(__file__) + '/data/dpkg-status')
+
+        __save1 = utils.get_dpkg_status_db
+        __save2 = utils.statuscache
+        utils.get_dpkg_status_db = mock.MagicMock(return_value=db)
+        utils.statuscache = {}
+
+        (pkgversion, pkgavail, depends, recommends, conffiles, maintainer,
+         installed, origin, vendor, reportinfo, priority, desc, src_name,
+         fulldesc, state, suggests, section) = utils.get_package_status('reportbug')
+
+        self.assertEqual(pkgversion, '11.1.0')
+        self.assertEqual(pkgavail, 'reportbug')
+        self.assertEqual(depends, (['apt'], ['python3-reportbug'],
+                                   ['sensible-utils'], ['python3:any']))
+        self.assertEqual(suggests, (['debsums'], ['dlocate']))
+        self.assertEqual([x[0] for x in conffiles],
+                         ['/etc/reportbug.conf', '/etc/reportbug with spaces.conf'])
+        self.assertTrue(installed)
+        self.assertEqual(state, 'installed')
+        self.assertEqual(desc, 'reports bugs in the Debian distribution')
+        self.assertEqual(section, 'utils')
+
+        status = utils.get_package_status('libfoo1:i386')
+        self.assertEqual(status[0], '1.2-3')
+        self.assertEqual(status[12], 'foo')
+
+        status = utils.get_package_status('removed')
+        self.assertFalse(status[6])
+        self.assertEqual(status[14], 'config-files')
+
+        status = utils.get_package_status('purged')
+        self.assertIsNone(status[1])
+
+        utils.get_dpkg_status_db = __save1
+        utils.statuscache = __save2
+        del __save1
+        del __save2
+
     def test_get_changed_config_files(self):
         status = utils.get_package_status('dpkg')
 
@@ -201,6 +276,31 @@ class TestPackages(unittest.TestCase):
         confinfo, changed = utils.get_changed_config_files(conffiles)
         self.assertIsNotNone(confinfo)
 
+    def test_get_changed_config_files_content(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            unchanged = os.path.join(tmpdir, 'unchanged.conf')
+            modified = os.path.join(tmpdir, 'modified.conf')
+            missing = os.path.join(tmpdir, 'missing.conf')
+            with open(unchanged, 'w') as fp:
+                fp.write('foo=1\n')
+            with open(modified, 'wb') as fp:
+                fp.write(b'# a comment\n\nfoo=2\nbar=\xff\n')
+
+            conffiles = [(modified, 'feedcafefeedcafefeedcafefeedcafe'),
+                         (missing, 'deadbeefdeadbeefdeadbeefdeadbeef'),
+                         (unchanged, '491db04c7b846d8f3a2a35e2239d80b0')]
+            self.assertEqual(utils.file_digest(unchanged),
+                             ('491db04c7b846d8f3a2a35e2239d80b0', None))
+
+            confinfo, changed = utils.get_changed_config_files(conffiles, jobs=2)
+            self.assertEqual(changed, [modified])
+            self.assertEqual(list(confinfo), [modified, missing])
+            self.assertEqual(confinfo[modified], 'changed:\nfoo=2\nbar=\\xff\n')
+            self.assertIsInstance(confinfo[missing], FileNotFoundError)
+
+            confinfo, changed = utils.get_changed_config_files(conffiles, nocompress=True)
+            self.assertEqual(confinfo[modified], 'changed:\n# a comment\n\nfoo=2\nbar=\\xff\n')
+
     def test_find_package_for(self):
         result = utils.find_package_for('dpkg')
         self.assertNotEqual(result[1], {})
@@ -267,14 +367,46 @@ Version: 6.6.3
         subprocess.getoutput = __save
         del __save
 
-        __save = utils.get_dpkg_database
+        __save1 = utils.get_dpkg_database
+        __save2 = utils.get_dpkg_status_db
+        utils.get_dpkg_status_db = mock.MagicMock(return_value=None)
         utils.get_dpkg_database = mock.MagicMock(return_value=[pkginfo % 'Description', ])
         result = utils.get_package_info([((pkg,), pkg)])
         self.assertEqual('reports bugs in the Debian distribution', result[0][3])
         utils.get_dpkg_database = mock.MagicMock(return_value=[pkginfo % 'Description-en', ])
         result = utils.get_package_info([((pkg,), pkg)])
         self.assertEqual('reports bugs in the Debian distribution', result[0][3])
-        utils.get_dpkg_database = __save
+        utils.get_dpkg_database = __save1
+        utils.get_dpkg_status_db = __save2
+        del __save1
+        del __save2
+
+    def test_package_info_index(self):
+        db = utils.DpkgStatusDB(os.path.dirname(__file__) + '/data/dpkg-status')
+        index = utils.PackageInfoIndex(db.paragraphs())
+
+        # packages not installed are not indexed
+        self.assertCountEqual(index.by_name.keys(),
+                              ['reportbug', 'libfoo1', 'mawk'])
+        self.assertEqual(list(index.by_provides.keys()), ['awk'])
+
+        self.assertEqual(index.search(['awk', 'reportbug']),
+                         [('reportbug', 'ii', '11.1.0',
+                           'reports bugs in the Debian distribution', None),
+                          ('mawk', 'ii', '1.3.4.20200120-3.1',
+                           'Pattern scanning and text processing language', 'awk')])
+        self.assertEqual([x[2] for x in index.search(['libfoo1'])],
+                         ['1.2-3+b1', '1.2-3'])
+        self.assertEqual(index.search(['removed', 'purged']), [])
+
+        __save = utils.get_package_info_index
+        utils.get_package_info_index = mock.MagicMock(return_value=index)
+        result = utils.get_package_info([(('awk', 'nonexisting'), 'awk'),
+                                         (('awk', 'nonexisting'), 'nonexisting'),
+                                         (('removed',), 'removed')])
+        self.assertEqual([x[0] for x in result], ['mawk', 'removed'])
+        self.assertEqual(result[1][1:], ('pn', '<none>', '(no description available)', None))
+        utils.get_package_info_index = __save
         del __save
 
     def test_packages_providing(self):
@@ -283,13 +415,84 @@ Version: 6.6.3
 
         self.assertGreater(len(result), 0)
 
+    def test_get_package_names(self):
+        __save1 = utils._package_names
+        __save2 = utils._apt_cache
+        __save3 = utils.subprocess.getoutput
+
+        utils._package_names = None
+        utils._apt_cache = None
+        utils.subprocess.getoutput = mock.MagicMock(return_value='zsh\nbash\nlibc6\n')
+        self.assertEqual(utils.get_package_names(), ('bash', 'libc6', 'zsh'))
+        # computed only once
+        self.assertEqual(utils.get_package_names(), ('bash', 'libc6', 'zsh'))
+        utils.subprocess.getoutput.assert_called_once()
+
+        # no need to run apt-cache if the APT cache is open already
+        utils._package_names = None
+        utils._apt_cache = mock.MagicMock()
+        utils._apt_cache.keys.return_value = ['zsh', 'libc6', 'libc6:i386']
+        utils.subprocess.getoutput.reset_mock()
+        self.assertEqual(utils.get_package_names(), ('libc6', 'zsh'))
+        utils.subprocess.getoutput.assert_not_called()
+
+        utils._package_names = __save1
+        utils._apt_cache = __save2
+        utils.subprocess.getoutput = __save3
+
     def test_get_avail_database(self):
         avail_db = utils.get_avail_database()
         entry = next(avail_db)
         self.assertIsNotNone(entry)
 
+    def test_avail_db_paragraphs(self):
+        with open(os.path.dirname(__file__) + '/data/dpkg-status', 'rb') as fp:
+            data = fp.read()
+
+        # paragraphs straddling the read blocks are stitched back together
+        for blocksize in (5, 64, 1 << 20):
+            avail_db = utils.AvailDB(fp=io.BytesIO(data + b'\n\nPackage: last'))
+            avail_db.blocksize = blocksize
+            entries = list(avail_db)
+            self.assertEqual(len(entries), 8)
+            self.assertTrue(entries[0].startswith('Package: reportbug\n'))
+            self.assertTrue(entries[0].endswith('\n'))
+            self.assertNotIn('\n\n', entries[0])
+            # a stray blank line yields an empty paragraph, as it always did
+            self.assertEqual(entries[-2], '')
+            self.assertEqual(entries[-1], 'Package: last')
+
+        avail_db = utils.AvailDB(fp=io.BytesIO(b'Package: foo\nDescription: \xff\n'))
+        raw = next(avail_db.raw())
+        self.assertIsInstance(raw, memoryview)
+        self.assertEqual(bytes(raw), b'Package: foo\nDescription: \xff\n')
+        avail_db = utils.AvailDB(fp=io.BytesIO(b'Package: foo\nDescription: \xff\n'))
+        self.assertEqual(next(avail_db), 'Package: foo\nDescription: \\xff\n')
+
 
 class TestSourcePackages(unittest.TestCase):
+    def test_apt_cache_not_opened_on_import(self):
+        # a fresh interpreter, as the cache may be open already in this one
+        code = textwrap.dedent("""\
+            import apt
+            def fail(*args, **kwargs):
+                raise SystemExit('apt.Cache opened at import time')
+            apt.Cache = fail
+            import reportbug.utils
+            assert reportbug.utils._apt_cache is None
+            """)
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def test_get_apt_cache(self):
+        __save = utils._apt_cache
+        utils._apt_cache = None
+        with mock.patch('apt.Cache') as cache:
+            self.assertIs(utils.get_apt_cache(), cache.return_value)
+            self.assertIs(utils.get_apt_cache(), cache.return_value)
+            cache.assert_called_once_with()
+        utils._apt_cache = __save
+
     def test_get_source_name(self):
         binpkg = 'python3-reportbug'
         src = utils.get_source_name(binpkg)
@@ -390,6 +593,59 @@ class TestSystemInformation(unittest.TestCase):
         del __save1
         del __save2
 
+    def test_system_facts(self):
+        def probe(value, delay=0.5):
+            def run():
+                time.sleep(delay)
+                return value
+            return run
+
+        def fail():
+            raise OSError
+
+        probes = {'one': (probe(1), None, 5),
+                  'two': (probe(2), None, 5),
+                  'slow': (probe(3, 5), 'timed out', 0.2),
+                  'late': (probe(4, 1.2), 'timed out', 0.2),
+                  'broken': (fail, 'failed', 5)}
+
+        start = time.monotonic()
+        facts = utils.SystemFacts(probes=probes)
+        self.assertEqual(facts.get('one'), 1)
+        self.assertEqual(facts.get('two'), 2)
+        self.assertEqual(facts.get('slow'), 'timed out')
+        self.assertEqual(facts.get('broken'), 'failed')
+        # the probes ran concurrently
+        self.assertLess(time.monotonic() - start, 1.5)
+
+        # a timed out probe keeps its default once it was used
+        self.assertEqual(facts.get('late'), 'timed out')
+        facts.threads['late'].join()
+        self.assertEqual(facts.get('late'), 'timed out')
+
+        # only the requested probes are started
+        facts = utils.SystemFacts(['one'], probes=probes)
+        self.assertEqual(list(facts.threads), ['one'])
+        self.assertEqual(facts.get('two'), 2)
+
+    def test_get_system_facts(self):
+        __save = utils._system_facts
+        utils._system_facts = None
+
+        try:
+            # only the probes asked for are started
+            facts = utils.get_system_facts(['shellpath', 'taint_flags'])
+            self.assertCountEqual(facts.threads, ['shellpath', 'taint_flags'])
+            self.assertIs(utils.get_system_facts(['charmap']), facts)
+            self.assertCountEqual(facts.threads, ['shellpath', 'taint_flags', 'charmap'])
+            self.assertEqual(facts.get('shellpath'), utils.realpath('/bin/sh'))
+            self.assertEqual(facts.get('taint_flags'), utils.get_kernel_taint_flags())
+            # all of them by default
+            self.assertIs(utils.get_system_facts(), facts)
+            self.assertCountEqual(facts.threads, utils.SYSTEM_PROBES)
+        finally:
+            utils._system_facts = __save
+
 
 class TestBugreportBody(unittest.TestCase):
     def test_get_dependency_info(self):
@@ -406,6 +662,24 @@ class TestBugreportBody(unittest.TestCase):
         result = utils.get_dependency_info('reportbug', [['awk']])
         self.assertIn('awk', result)
 
+    def test_get_dependencies_info(self):
+        relations = [('reportbug', [['dpkg']], 'depends on'),
+                     ('reportbug', [], 'recommends'),
+                     ('reportbug', [['awk'], ['nonexisting']], 'suggests'),
+                     ('dpkg', [['tar']], 'is related to')]
+
+        __save = utils.get_package_info_index
+        utils.get_package_info_index = mock.MagicMock(side_effect=__save)
+        result = utils.get_dependencies_info(relations)
+        # the dpkg database is looked at just once
+        self.assertEqual(utils.get_package_info_index.call_count, 1)
+        utils.get_package_info_index = __save
+        del __save
+
+        self.assertEqual(result, [utils.get_dependency_info(*r) for r in relations])
+        self.assertEqual(utils.get_dependencies_info([('reportbug', [], 'depends on')]),
+                         ['\nreportbug depends on no packages.\n'])
+
     def test_bts657753(self):
         # check that non-existing deps gets a correct installation info
         # and not just the last one applied to anyone
@@ -719,6 +993,58 @@ class TestDpkg(unittest.TestCase):
         self.assertEqual(res[0], p)
         self.assertEqual(res[1], {})
 
+    def test_dpkg_file_index(self):
+        with tempfile.TemporaryDirectory() as infodir:
+            def write_list(package, paths, mtime):
+                filename = os.path.join(infodir, package + '.list')
+                with open(filename, 'w') as fp:
+                    fp.write(''.join(p + '\n' for p in ['/.'] + paths))
+                os.utime(filename, (mtime, mtime))
+                os.utime(infodir, (mtime, mtime))
+
+            write_list('foo', ['/usr', '/usr/bin', '/usr/bin/foo', '/bin/oldfoo'], 1000)
+            write_list('libbar1:amd64', ['/usr', '/usr/lib', '/usr/lib/libbar.so.1'], 1000)
+
+            index = utils.DpkgFileIndex(':memory:', infodir)
+            index.refresh()
+
+            self.assertEqual(index.search('/usr/bin/foo'), {'foo': ['/usr/bin/foo']})
+            self.assertEqual(index.search('/usr/bin/'), {'foo': ['/usr/bin']})
+            self.assertEqual(sorted(index.search('/usr')), ['foo', 'libbar1:amd64'])
+            self.assertEqual(index.search('libbar'), {'libbar1:amd64': ['/usr/lib/libbar.so.1']})
+            self.assertEqual(index.search('/'), {})
+            self.assertEqual(index.search('/usr/bin/bar'), {})
+
+            self.assertEqual(index.aliases('/usr/bin/oldfoo'), ['/bin/oldfoo'])
+            self.assertEqual(index.aliases('/lib/libbar.so.1'), ['/usr/lib/libbar.so.1'])
+            self.assertEqual(index.aliases('/usr/share/foo'), [])
+
+            # only what changed is indexed again
+            write_list('foo', ['/usr', '/usr/bin', '/usr/bin/foo2'], 2000)
+            os.unlink(os.path.join(infodir, 'libbar1:amd64.list'))
+            os.utime(infodir, (3000, 3000))
+            with mock.patch.object(index, '_index_list', wraps=index._index_list) as index_list:
+                index.refresh()
+                self.assertEqual([c[0][0] for c in index_list.call_args_list], ['foo'])
+                # nothing changed at all
+                index_list.reset_mock()
+                index.refresh()
+                index_list.assert_not_called()
+
+            self.assertEqual(index.search('/usr/bin/foo'), {})
+            self.assertEqual(index.search('/usr/bin/foo2'), {'foo': ['/usr/bin/foo2']})
+            self.assertEqual(index.search('libbar'), {})
+
+            # with merged /usr, files are looked up in both places
+            __save = utils.get_dpkg_file_index
+            utils.get_dpkg_file_index = mock.MagicMock(return_value=index)
+            write_list('foo', ['/bin', '/bin/foo'], 4000)
+            index.refresh()
+            self.assertEqual(utils.query_dpkg_for('/usr/bin/foo'),
+                             ('/bin/foo', {'foo': ['/bin/foo']}))
+            self.assertEqual(utils.query_dpkg_for('/usr/bin/nofoo'), ('/usr/bin/nofoo', {}))
+            utils.get_dpkg_file_index = __save
+
 
 class TestMisc(unittest.TestCase):
     def test_first_run(self):
@@ -737,6 +1063,19 @@ class TestMisc(unittest.TestCase):
         self.assertIn('User: morph@debian.org', ph)
         self.assertIn('/etc/fstab', a)
 
+    def test_launch_mbox_reader(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            copy = os.path.join(tmpdir, 'copy')
+            chunks = [b'From a@example.org Mon Jan  6 10:00:00 2020\n', b'\xe9t\xe9\n']
+            utils.launch_mbox_reader('cp %s ' + copy, iter(chunks))
+            with open(copy, 'rb') as fp:
+                self.assertEqual(fp.read(), b''.join(chunks))
+
+            # nothing to read, nothing launched
+            os.unlink(copy)
+            utils.launch_mbox_reader('cp %s ' + copy, iter([]))
+            self.assertFalse(os.path.exists(copy))
+
     def test_check_package_name(self):
         self.assertTrue(utils.check_package_name('reportbug'))
         self.assertTrue(utils.check_package_name('ab'))